@@ -37,14 +37,18 @@ def get_flags() -> list:
     #  - Firmware software version (``___SOFTWARE_VERSION___``)
     #  - Hardware major version (``___HARDWARE_MAJOR_VERSION``)
     #  - Hardware minor version (``___HARDWARE_MINOR_VERSION``)
-    #  - Serial baud rate (``HV_SWITCHING_BOARD_BAUD_RATE``)
-    #  - I2C rate (``HV_SWITCHING_BOARD_I2C_RATE``)
+    #  - Default serial baud rate (``HV_SWITCHING_BOARD_BAUD_RATE``)
+    #  - Default I2C rate (``HV_SWITCHING_BOARD_I2C_RATE``)
     #  - Shift register count (``___SHIFT_REGISTER_COUNT___``)
     #
     # .. versionchanged:: 0.9
     #     Add serial baud rate (``HV_SWITCHING_BOARD_BAUD_RATE``).
     # .. versionchanged:: 0.17
     #     Add shift register count (``___SHIFT_REGISTER_COUNT___``).
+    # .. versionchanged:: 4.2
+    #     Serial baud rate and I2C rate are defaults, which may be changed at
+    #     runtime (see ``HVSwitchingBoard.set_baud_rate()`` and
+    #     ``HVSwitchingBoard.set_i2c_rate()``).
     software_version = VERSION
     major_version = sys.argv[1]
     minor_version = sys.argv[2]
@@ -3,7 +3,7 @@ from typing import List, Dict
 
 from path_helpers import path
 
-from .driver import HVSwitchingBoard
+from .driver import HVSwitchingBoard, encode_frames, decode_frames
 
 from ._version import get_versions
 
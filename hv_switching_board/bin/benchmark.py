@@ -0,0 +1,169 @@
+"""
+Measure achievable I2C throughput to one or more switching boards.
+
+Uses the firmware echo/sink/source commands, which move payload bytes over the
+bus **without** touching the switching board outputs.
+
+Modes:
+
+ - ``write``: write-only transfer (no response is read back).
+ - ``sink``: write payload, then read back return code.
+ - ``source``: request payload from the board.
+ - ``echo``: write payload, then read the same payload back.
+
+Example::
+
+    python -m hv_switching_board.bin.benchmark -a 32 -a 33 -s 6 -s 31 -r 50
+
+.. versionadded:: 4.2
+"""
+from argparse import ArgumentParser
+import time
+
+from typing import Dict, List
+
+from hv_switching_board.discovery import DEFAULT_EXCLUDE
+from hv_switching_board.driver import (HVSwitchingBoard, CMD_SINK,
+                                       MAX_I2C_PAYLOAD)
+
+MODES = ('write', 'sink', 'source', 'echo')
+
+
+def benchmark(board: HVSwitchingBoard, mode: str, payload_size: int,
+              duration: float = 1.) -> Dict:
+    """
+    Repeat a transaction against a board for (at least) ``duration`` seconds.
+
+    Parameters
+    ----------
+    board : HVSwitchingBoard
+    mode : str
+        One of `MODES`.
+    payload_size : int
+        Payload bytes per transaction.
+    duration : float, optional
+        Measurement time in seconds.
+
+    Returns
+    -------
+    dict
+        ``transactions``, ``elapsed`` (seconds), ``transactions_per_s`` and
+        ``bytes_per_s`` (payload bytes moved in either direction).
+    """
+    payload = bytes(range(payload_size))
+    packet = [CMD_SINK] + list(payload)
+
+    def write():
+        # Bypass `send_command`, which always reads back the return code.
+        board.write_raw(packet)
+
+    def sink():
+        board.sink(payload)
+
+    def source():
+        board.source(payload_size)
+
+    def echo():
+        board.echo(payload)
+
+    transactions = {'write': write, 'sink': sink, 'source': source,
+                    'echo': echo}
+    if mode in transactions:
+        transaction = transactions[mode]
+    else:
+        raise ValueError(f"Unknown mode `{mode}`; expected one of {MODES}")
+
+    bytes_per_transaction = payload_size * (2 if mode == 'echo' else 1)
+    count = 0
+    start = time.perf_counter()
+    end = start + duration
+    while True:
+        transaction()
+        count += 1
+        now = time.perf_counter()
+        if now >= end:
+            break
+    elapsed = now - start
+    return {'transactions': count,
+            'elapsed': elapsed,
+            'transactions_per_s': count / elapsed,
+            'bytes_per_s': count * bytes_per_transaction / elapsed}
+
+
+def run(boards: List[HVSwitchingBoard], modes: List[str],
+        payload_sizes: List[int], duration: float) -> List[Dict]:
+    results = []
+    for board in boards:
+        for mode in modes:
+            for size in payload_sizes:
+                result = benchmark(board, mode, size, duration)
+                result.update(address=board.address, mode=mode,
+                              payload_size=size)
+                results.append(result)
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Measure I2C throughput to switching '
+                            'boards (outputs are not touched).')
+    parser.add_argument('-p', '--port', default=None,
+                        help='Serial port of DropBot proxy (default: '
+                        'auto-detect).')
+    parser.add_argument('-a', '--address', type=int, action='append',
+                        help='I2C address of board (may be repeated; '
+                        'default: all boards found by I2C scan).')
+    parser.add_argument('-m', '--mode', action='append', choices=MODES,
+                        help='Benchmark mode (may be repeated; default: all '
+                        'modes).')
+    parser.add_argument('-s', '--payload-size', type=int, action='append',
+                        help='Payload size in bytes (may be repeated; '
+                        'default: board shift register count and %d).'
+                        % MAX_I2C_PAYLOAD)
+    parser.add_argument('-d', '--duration', type=float, default=1.,
+                        help='Seconds per measurement (default: %(default)s).')
+    parser.add_argument('-r', '--frame-rate', type=float, default=None,
+                        help='If set, estimate number of boards per bus that '
+                        'sustain this full-frame rate (Hz).')
+    args = parser.parse_args()
+
+    from dropbot import SerialProxy
+
+    proxy = SerialProxy(port=args.port)
+    try:
+        addresses = args.address or [int(a) for a in proxy.i2c_scan()
+                                     if int(a) not in DEFAULT_EXCLUDE]
+        boards = [HVSwitchingBoard(proxy, a) for a in addresses]
+        modes = args.mode or list(MODES)
+
+        for board in boards:
+            try:
+                i2c_rate = f"{board.bus_settings()['i2c_rate']} Hz"
+            except IOError:
+                # Firmware does not support runtime bus settings.
+                i2c_rate = 'unknown'
+            print(f"Board {board.address} (I2C rate: {i2c_rate})")
+            print(f"{'address':>7} {'mode':>6} {'bytes':>5} {'tx/s':>9} "
+                  f"{'bytes/s':>9}")
+            frame_size = board.get_shift_register_count()
+            payload_sizes = args.payload_size or sorted({frame_size,
+                                                         MAX_I2C_PAYLOAD})
+            if args.frame_rate and 'write' in modes:
+                payload_sizes = sorted(set(payload_sizes) | {frame_size})
+            results = run([board], modes, payload_sizes, args.duration)
+            for r in results:
+                print(f"{r['address']:>7} {r['mode']:>6} "
+                      f"{r['payload_size']:>5} "
+                      f"{r['transactions_per_s']:>9.1f} "
+                      f"{r['bytes_per_s']:>9.1f}")
+            if args.frame_rate and 'write' in modes:
+                # A full frame is one write-only transfer of
+                # `shift_register_count` bytes.
+                frame_writes = [r for r in results if r['mode'] == 'write' and
+                                r['payload_size'] == frame_size][0]
+                boards_per_bus = int(frame_writes['transactions_per_s'] //
+                                     args.frame_rate)
+                print(f"Board {board.address}: up to {boards_per_bus} "
+                      f"board(s) per bus at {args.frame_rate:g} Hz "
+                      f"({frame_size}-byte frames)")
+    finally:
+        proxy.terminate()
@@ -0,0 +1,45 @@
+"""
+Run a local daemon owning the DropBot proxy and switching boards, so several
+processes can share the bus (see `hv_switching_board.daemon`).
+
+Example::
+
+    python -m hv_switching_board.bin.daemon -a 32 -a 33
+
+.. versionadded:: 4.2
+"""
+from argparse import ArgumentParser
+import logging
+
+from hv_switching_board.daemon import default_socket_path, serve
+from hv_switching_board.discovery import DEFAULT_EXCLUDE
+from hv_switching_board.driver import HVSwitchingBoard
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Serve switching boards to local '
+                            'clients over a Unix domain socket.')
+    parser.add_argument('-p', '--port', default=None,
+                        help='Serial port of DropBot proxy (default: '
+                        'auto-detect).')
+    parser.add_argument('-a', '--address', type=int, action='append',
+                        help='I2C address of board (may be repeated; '
+                        'default: all boards found by I2C scan).')
+    parser.add_argument('-s', '--socket', default=default_socket_path(),
+                        help='Socket path (default: %(default)s).')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else
+                        logging.INFO)
+
+    from dropbot import SerialProxy
+
+    proxy = SerialProxy(port=args.port)
+    try:
+        addresses = args.address or [int(a) for a in proxy.i2c_scan()
+                                     if int(a) not in DEFAULT_EXCLUDE]
+        boards = [HVSwitchingBoard(proxy, a) for a in addresses]
+        serve(boards, args.socket)
+    finally:
+        proxy.terminate()
@@ -0,0 +1,63 @@
+"""
+Replay an I2C transaction log (see `hv_switching_board.recording`) against a
+DropBot proxy or a simulated one, and compare transaction durations with the
+recording.
+
+Example::
+
+    python -m hv_switching_board.bin.replay trace.hvr --simulate --fast
+
+.. versionadded:: 4.2
+"""
+from argparse import ArgumentParser
+
+from hv_switching_board.recording import read_log, replay, SimulatedProxy
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Replay an I2C transaction log.')
+    parser.add_argument('log', help='Transaction log file.')
+    parser.add_argument('-p', '--port', default=None,
+                        help='Serial port of DropBot proxy (default: '
+                        'auto-detect).')
+    parser.add_argument('--simulate', action='store_true',
+                        help='Replay against simulated boards (inferred from '
+                        'log) instead of a DropBot proxy.')
+    parser.add_argument('-l', '--latency', type=float, default=0.,
+                        help='Simulated seconds per transaction (default: '
+                        '%(default)s).')
+    timing = parser.add_mutually_exclusive_group()
+    timing.add_argument('-s', '--speed', type=float, default=1.,
+                        help='Replay at this multiple of the original rate '
+                        '(default: %(default)s).')
+    timing.add_argument('-f', '--fast', action='store_true',
+                        help='Replay as fast as possible.')
+    args = parser.parse_args()
+
+    transactions = list(read_log(args.log))
+    if args.simulate:
+        proxy = SimulatedProxy.from_log(transactions, latency=args.latency)
+    else:
+        from dropbot import SerialProxy
+
+        proxy = SerialProxy(port=args.port)
+    try:
+        report = replay(transactions, proxy,
+                        speed=None if args.fast else args.speed)
+    finally:
+        if not args.simulate:
+            proxy.terminate()
+
+    print(f"{report['transactions']} transactions in "
+          f"{report['duration']:.3f} s (recorded: "
+          f"{report['recorded_duration']:.3f} s); {report['failed']} failed, "
+          f"{report['mismatches']} response mismatch(es)")
+    print(f"{'operation':>16} {'count':>7} {'mean ms':>9} {'max ms':>9} "
+          f"{'rec. mean':>9} {'rec. max':>9}")
+    for name, stats in report['operations'].items():
+        if stats['count']:
+            print(f"{name:>16} {stats['count']:>7} "
+                  f"{1e3 * stats['duration_mean']:>9.3f} "
+                  f"{1e3 * stats['duration_max']:>9.3f} "
+                  f"{1e3 * stats['recorded_duration_mean']:>9.3f} "
+                  f"{1e3 * stats['recorded_duration_max']:>9.3f}")
@@ -0,0 +1,279 @@
+# coding: utf-8
+"""
+Compile actuation protocols ahead of time into delta-coded I2C transaction
+streams, so playback only does bus I/O.
+
+Consecutive fleet frames are diffed in one vectorized pass over (chunks of)
+the whole protocol.  Changed ports of each board are grouped into PCA9505
+auto-increment writes using a simple cost model: two runs of changed ports
+are merged into one write if rewriting the unchanged ports between them
+costs less than an extra transaction.  Each write is therefore a single port
+(`WRITE_SINGLE`), a range of ports (`WRITE_RANGE`) or all ports of the board
+(`WRITE_FULL`), and its raw I2C payload (register byte and **active LOW**
+port bytes) is precomputed::
+
+    compiled = compile_protocol(states, index)
+    for frame, timestamp in enumerate(timestamps):
+        wait_until(start + timestamp)
+        compiled.write(boards, frame)
+
+.. versionadded:: 4.2
+"""
+import math
+
+from typing import (Dict, Iterable, Iterator, Optional, Sequence, Tuple,
+                    Union)
+
+import numpy as np
+
+from .driver import (HVSwitchingBoard, PCA9505_AUTO_INCREMENT,
+                     PCA9505_OUTPUT_PORT_REGISTER)
+from .fleet import FleetState
+from .routing import RoutingIndex
+
+WRITE_SINGLE = 0
+WRITE_RANGE = 1
+WRITE_FULL = 2
+
+#: Compiled write; ``payload[offset:offset + length + 1]`` is the raw I2C
+#: payload (register byte followed by ``length`` port bytes).
+TRANSACTION_DTYPE = np.dtype([('frame', '<u4'), ('board', '<u2'),
+                              ('kind', 'u1'), ('start', 'u1'),
+                              ('length', 'u1'), ('offset', '<u8')])
+
+
+class CompiledProtocol:
+    def __init__(self, shift_register_counts: Sequence[int],
+                 frame_count: int, transactions: np.array,
+                 payload: np.array):
+        """
+        Use `compile_frames()` or `compile_protocol()` instead.
+        """
+        self.shift_register_counts = np.asarray(shift_register_counts,
+                                                dtype=int)
+        self.frame_count = frame_count
+        #: Writes, in frame order (see `TRANSACTION_DTYPE`).
+        self.transactions = transactions
+        #: Raw I2C payload bytes of all writes.
+        self.payload = payload
+        #: Writes of frame ``i`` are ``transactions[frame_offsets[i]:
+        #: frame_offsets[i + 1]]``.
+        self.frame_offsets = np.searchsorted(transactions['frame'],
+                                             np.arange(frame_count + 1))
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    def frame_writes(self, frame: int) -> Iterator[Tuple[int, list]]:
+        """
+        Iterate over ``(board, payload)`` writes of ``frame``.
+        """
+        transactions = self.transactions[self.frame_offsets[frame]:
+                                         self.frame_offsets[frame + 1]]
+        for board, length, offset in zip(transactions['board'].tolist(),
+                                         transactions['length'].tolist(),
+                                         transactions['offset'].tolist()):
+            yield board, self.payload[offset:offset + length + 1].tolist()
+
+    def write(self, boards: Sequence[HVSwitchingBoard], frame: int,
+              fleet: Optional[FleetState] = None) -> int:
+        """
+        Issue writes of ``frame`` to ``boards`` (in compiled board order).
+
+        Each write holds the bus lock of the board proxy, and deferred state
+        of the board (see `HVSwitchingBoard.flush()`) is written first, so it
+        cannot override the frame afterwards.
+
+        Parameters
+        ----------
+        boards : list
+            Boards, in compiled board order.
+        frame : int
+            Frame index.
+        fleet : FleetState, optional
+            Fleet shadow to record writes in (e.g., to continue with
+            `FleetState.update()` after playback).  If a write fails, the
+            state of that board is marked unknown before the error is raised.
+
+        Returns
+        -------
+        int
+            Number of I2C transactions.
+        """
+        transactions = self.transactions[self.frame_offsets[frame]:
+                                         self.frame_offsets[frame + 1]]
+        count = 0
+        for (board, payload), start in zip(self.frame_writes(frame),
+                                           transactions['start'].tolist()):
+            try:
+                boards[board].write_raw(payload)
+            except Exception:
+                if fleet is not None:
+                    fleet.invalidate(board)
+                raise
+            if fleet is not None:
+                # Payload port bytes are active LOW.
+                fleet.commit([(board, start,
+                               ~np.asarray(payload[1:], dtype=np.uint8))])
+            count += 1
+        return count
+
+    def summary(self) -> Dict[str, int]:
+        """
+        Return transaction count of each kind (``single``, ``range``,
+        ``full``), total ``transactions`` and ``port_bytes``, and
+        ``naive_port_bytes`` (i.e., all ports of all boards every frame).
+        """
+        kinds = np.bincount(self.transactions['kind'], minlength=3)
+        return {'frames': self.frame_count,
+                'transactions': len(self.transactions),
+                'single': int(kinds[WRITE_SINGLE]),
+                'range': int(kinds[WRITE_RANGE]),
+                'full': int(kinds[WRITE_FULL]),
+                'port_bytes': int(self.transactions['length']
+                                  .sum(dtype=np.uint64)),
+                'naive_port_bytes': int(self.frame_count *
+                                        self.shift_register_counts.sum())}
+
+
+def _compile_chunk(frames: np.array, previous: np.array, known: np.array,
+                   port_mask: np.array, counts: np.array, merge_gap: int,
+                   first_frame: int, payload_offset: int) -> \
+        Tuple[np.array, np.array]:
+    board_count = frames.shape[1]
+    changed = np.empty(frames.shape, dtype=bool)
+    changed[0] = (frames[0] != previous) | ~known[:, None]
+    changed[1:] = frames[1:] != frames[:-1]
+    changed &= port_mask
+
+    # Changed ports, sorted by frame, then board, then port.
+    frame, board, port = np.nonzero(changed)
+    row = frame * board_count + board
+    # Start new write at each new board frame, or where the gap to the
+    # previous changed port is larger than `merge_gap`.
+    new_run = np.ones(len(port), dtype=bool)
+    new_run[1:] = (row[1:] != row[:-1]) | (np.diff(port) > merge_gap + 1)
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(port)) - 1
+
+    run_frame = frame[starts]
+    run_board = board[starts]
+    run_start = port[starts]
+    run_length = port[ends] - run_start + 1
+
+    transactions = np.empty(len(starts), dtype=TRANSACTION_DTYPE)
+    transactions['frame'] = run_frame + first_frame
+    transactions['board'] = run_board
+    transactions['start'] = run_start
+    transactions['length'] = run_length
+    transactions['kind'] = np.where((run_start == 0) &
+                                    (run_length == counts[run_board]),
+                                    WRITE_FULL,
+                                    np.where(run_length == 1, WRITE_SINGLE,
+                                             WRITE_RANGE))
+    offsets = np.cumsum(run_length + 1) - (run_length + 1)
+    transactions['offset'] = offsets + payload_offset
+
+    # Register byte of each write, followed by its (active LOW) port bytes.
+    payload = np.empty(int((run_length + 1).sum()), dtype=np.uint8)
+    payload[offsets] = PCA9505_AUTO_INCREMENT | \
+        (PCA9505_OUTPUT_PORT_REGISTER + run_start)
+    run = np.repeat(np.arange(len(starts)), run_length)
+    within = np.arange(len(run)) - np.repeat(np.cumsum(run_length) -
+                                             run_length, run_length)
+    payload[offsets[run] + 1 + within] = \
+        ~frames[run_frame[run], run_board[run], run_start[run] + within]
+    return transactions, payload
+
+
+def _compile_chunks(chunks: Iterable[np.array], counts: np.array,
+                    fleet: FleetState, transaction_cost: float = 3.) -> \
+        CompiledProtocol:
+    # Compile consecutive chunks of frames, diffing the first frame of each
+    # chunk against the last frame of the previous one.
+    merge_gap = max(int(math.ceil(transaction_cost)) - 1, 0)
+    previous = fleet.shadow.copy()
+    known = fleet.known.copy()
+    port_mask = (np.arange(fleet.max_ports)[None, :] < counts[:, None])
+
+    transactions, payloads = [], []
+    frame_count = payload_size = 0
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.uint8)
+        if chunk.shape[1:] != fleet.shadow.shape:
+            raise ValueError(f"Expected frames of shape {fleet.shadow.shape}, "
+                             f"got {chunk.shape[1:]}")
+        if not len(chunk):
+            continue
+        transactions_i, payload_i = \
+            _compile_chunk(chunk, previous, known, port_mask, counts,
+                           merge_gap, frame_count, payload_size)
+        transactions.append(transactions_i)
+        payloads.append(payload_i)
+        payload_size += len(payload_i)
+        frame_count += len(chunk)
+        previous = chunk[-1]
+        known[:] = True
+
+    return CompiledProtocol(
+        counts, frame_count,
+        np.concatenate(transactions) if transactions else
+        np.empty(0, dtype=TRANSACTION_DTYPE),
+        np.concatenate(payloads) if payloads else
+        np.empty(0, dtype=np.uint8))
+
+
+def compile_frames(frames: np.array, shift_register_counts: Sequence[int],
+                   fleet: Optional[FleetState] = None,
+                   transaction_cost: float = 3.,
+                   chunk_size: int = 4096) -> CompiledProtocol:
+    """
+    Compile fleet frames into delta-coded writes.
+
+    Parameters
+    ----------
+    frames : numpy.array
+        **Active HIGH** port bytes of shape ``(frame_count, board_count,
+        max_ports)`` (e.g., `RoutingIndex.pack` output, or
+        `ProtocolFile.ports`).
+    shift_register_counts : list
+        Number of shift registers (i.e., ports) of each board.
+    fleet : FleetState, optional
+        Fleet state before the first frame (default: unknown, i.e., first
+        frame written in full).
+    transaction_cost : float, optional
+        Cost of an extra I2C transaction, in port bytes (default: 3, i.e.,
+        address byte, register byte and start/stop conditions).  Runs of
+        changed ports separated by fewer unchanged ports are merged.
+    chunk_size : int, optional
+        Number of frames diffed at a time (bounds memory use, e.g., for
+        memory-mapped frames).
+    """
+    counts = np.asarray(shift_register_counts, dtype=int)
+    fleet = fleet or FleetState(counts)
+    if frames.shape[1:] != fleet.shadow.shape:
+        raise ValueError(f"Expected frames of shape {fleet.shadow.shape}, got "
+                         f"{frames.shape[1:]}")
+    return _compile_chunks((frames[i:i + chunk_size]
+                            for i in range(0, len(frames), chunk_size)),
+                           counts, fleet, transaction_cost)
+
+
+def compile_protocol(states: Union[Sequence, np.array], index: RoutingIndex,
+                     **kwargs) -> CompiledProtocol:
+    """
+    Compile ``(frame_count, channel_count)`` global channel states (see
+    `RoutingIndex`) into delta-coded writes.
+
+    Each chunk of states is packed into frames and compiled in turn, so the
+    packed frames of the whole protocol are never held in memory at once.
+
+    See `compile_frames()` for keyword arguments.
+    """
+    states = np.asarray(states)
+    chunk_size = kwargs.pop('chunk_size', 4096)
+    counts = np.asarray(index.shift_register_counts, dtype=int)
+    fleet = kwargs.pop('fleet', None) or FleetState(counts)
+    return _compile_chunks((index.pack(states[i:i + chunk_size])
+                            for i in range(0, len(states), chunk_size)),
+                           counts, fleet, **kwargs)
@@ -0,0 +1,396 @@
+# coding: utf-8
+"""
+Local daemon owning the bus (i.e., the proxy and `HVSwitchingBoard`
+instances), serving any number of client processes over a Unix domain
+socket.
+
+Each request is a header ``(opcode, board, length)`` (`HEADER`) followed by
+``length`` payload bytes; each response is a header ``(opcode, status,
+length)`` followed by ``length`` payload bytes (an error message if
+``status`` is not `STATUS_OK`).
+
+===================  ===========================  ===========================
+Opcode               Request payload              Response payload
+===================  ===========================  ===========================
+`OP_LIST_BOARDS`     N/A                          ``[address, n]`` per board
+`OP_SUBMIT`          ``n`` **active HIGH** ports  N/A
+`OP_GET_STATE`       N/A                          ``n`` **active HIGH** ports
+`OP_GET_STATS`       N/A                          `STATS_DTYPE` record
+`OP_FLUSH`           N/A                          N/A
+===================  ===========================  ===========================
+
+Submitted frames are queued, and a single bus thread writes the latest frame
+of every board with changed ports only (see `FleetState`), so frames
+submitted by all clients between two bus cycles are coalesced into the
+fewest bus transactions.  Reads and stats are served by the bus thread after
+pending frames are written.
+
+.. versionadded:: 4.2
+"""
+import os
+import socket
+import struct
+import logging
+import threading
+import socketserver
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .driver import HVSwitchingBoard, STATS_DTYPE, _encode_state
+from .fleet import FleetState
+
+logger = logging.getLogger(__name__)
+
+#: Request header ``(opcode, board, length)``; response header ``(opcode,
+#: status, length)``.
+HEADER = struct.Struct('<BBH')
+
+OP_LIST_BOARDS = 0x01
+OP_SUBMIT = 0x02
+OP_GET_STATE = 0x03
+OP_GET_STATS = 0x04
+OP_FLUSH = 0x05
+
+STATUS_OK = 0x00
+STATUS_ERROR = 0x01
+
+
+def default_socket_path() -> str:
+    """
+    Return default daemon socket path (in the user runtime directory).
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR', '/tmp')
+    return os.path.join(runtime_dir, f'hv-switching-board-{os.getuid()}.sock')
+
+
+def _read_exactly(stream, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError('Connection closed.')
+        data += chunk
+    return data
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.daemon
+        while True:
+            try:
+                opcode, board, length = HEADER.unpack(
+                    _read_exactly(self.rfile, HEADER.size))
+                payload = _read_exactly(self.rfile, length)
+            except EOFError:
+                return
+            try:
+                status, response = STATUS_OK, daemon.handle(opcode, board,
+                                                            payload)
+            except Exception as exception:
+                logger.debug(f'Request 0x{opcode:02x} failed: {exception}')
+                status, response = STATUS_ERROR, str(exception).encode()
+            self.wfile.write(HEADER.pack(opcode, status, len(response)) +
+                             response)
+
+
+class HVSwitchingBoardDaemon:
+    def __init__(self, boards: Sequence[HVSwitchingBoard],
+                 socket_path: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        boards : list
+            Boards served (clients address boards by index in this list).
+        socket_path : str, optional
+            Unix domain socket path (default: `default_socket_path()`).
+        """
+        self.boards = list(boards)
+        self.socket_path = socket_path or default_socket_path()
+        self.fleet = FleetState([board.shift_register_count
+                                 for board in self.boards])
+        #: Frame counters: ``submits`` (frames submitted by clients),
+        #: ``flushes`` (bus cycles writing frames) and ``writes`` (bus
+        #: transactions).
+        self.counters = {'submits': 0, 'flushes': 0, 'writes': 0}
+        # Latest submitted frames (written by the bus thread).
+        self._target = self.fleet.shadow.copy()
+        # Boards submitted by any client (others are never written).
+        self._submitted = np.zeros(len(self.boards), dtype=bool)
+        self._dirty = False
+        self._tasks = deque()
+        self._condition = threading.Condition()
+        self._running = False
+        self._bus_thread = None
+        self._server = None
+
+    # Bus thread
+    # ----------
+    def _bus_loop(self) -> None:
+        while True:
+            with self._condition:
+                while self._running and not (self._dirty or self._tasks):
+                    self._condition.wait()
+                if not self._running:
+                    break
+                frames = self._target.copy() if self._dirty else None
+                submitted = self._submitted.copy()
+                self._dirty = False
+                tasks = list(self._tasks)
+                self._tasks.clear()
+            if frames is not None:
+                self._write(frames, submitted)
+            for function, future in tasks:
+                try:
+                    future.set_result(function())
+                except Exception as exception:
+                    future.set_exception(exception)
+        with self._condition:
+            tasks = list(self._tasks)
+            self._tasks.clear()
+        for function, future in tasks:
+            future.set_exception(IOError('Daemon stopped.'))
+
+    def _write(self, frames: np.array, submitted: np.array) -> None:
+        self.counters['flushes'] += 1
+        for write in self.fleet.plan(frames):
+            board, start, ports = write
+            if not submitted[board]:
+                # Leave boards no client submitted untouched.
+                continue
+            try:
+                self.boards[board].write_ports(ports, start)
+            except Exception as exception:
+                logger.error(f'Write to board {self.boards[board].address} '
+                             f'failed: {exception}')
+                self.fleet.invalidate(board)
+                continue
+            self.fleet.commit([write])
+            self.counters['writes'] += 1
+
+    def call(self, function: Callable):
+        """
+        Run ``function`` in the bus thread (after pending frames are written)
+        and return its result.
+        """
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise IOError('Daemon is not running.')
+            self._tasks.append((function, future))
+            self._condition.notify()
+        return future.result()
+
+    def submit(self, board: int, ports: Union[bytes, np.array]) -> None:
+        """
+        Queue **active HIGH** port bytes of ``board`` for writing.
+        """
+        ports = np.frombuffer(bytes(ports), dtype=np.uint8)
+        count = self.fleet.shift_register_counts[board]
+        if len(ports) != count:
+            raise ValueError(f"Expected {count} port bytes for board {board}, "
+                             f"got {len(ports)}")
+        with self._condition:
+            self._target[board, :count] = ports
+            self._submitted[board] = True
+            self._dirty = True
+            self.counters['submits'] += 1
+            self._condition.notify()
+
+    # Requests
+    # --------
+    def _board(self, index: int) -> HVSwitchingBoard:
+        if index >= len(self.boards):
+            raise IndexError(f"No board {index} (serving {len(self.boards)} "
+                             f"boards)")
+        return self.boards[index]
+
+    def handle(self, opcode: int, board: int, payload: bytes) -> bytes:
+        """
+        Handle request and return response payload.
+        """
+        if opcode == OP_LIST_BOARDS:
+            return bytes([value for b in self.boards
+                          for value in (b.address, b.shift_register_count)])
+        elif opcode == OP_SUBMIT:
+            self._board(board)
+            self.submit(board, payload)
+            return b''
+        elif opcode == OP_GET_STATE:
+            board_ = self._board(board)
+            state = self.call(board_.state_of_all_channels)
+            return (~_encode_state(state, board_.shift_register_count))\
+                .tobytes()
+        elif opcode == OP_GET_STATS:
+            return self.call(self._board(board).stats).tobytes()
+        elif opcode == OP_FLUSH:
+            self.call(lambda: None)
+            return b''
+        raise ValueError(f"Unknown opcode 0x{opcode:02x}")
+
+    # Server
+    # ------
+    def start(self) -> None:
+        """
+        Start bus thread and listen on socket (see `serve_forever()`).
+        """
+        if os.path.exists(self.socket_path):
+            # Remove stale socket, unless another daemon is listening on it.
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.remove(self.socket_path)
+            else:
+                raise IOError(f"Daemon already listening on "
+                              f"`{self.socket_path}`")
+            finally:
+                probe.close()
+        self._server = socketserver.ThreadingUnixStreamServer(
+            self.socket_path, _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.daemon = self
+        self._running = True
+        self._bus_thread = threading.Thread(target=self._bus_loop,
+                                            name='hv-switching-bus',
+                                            daemon=True)
+        self._bus_thread.start()
+
+    def serve_forever(self) -> None:
+        """
+        Serve requests until `shutdown()` is called (from another thread).
+        """
+        if self._server is None:
+            self.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._bus_thread is not None:
+            self._bus_thread.join()
+            self._bus_thread = None
+        if self._server is not None:
+            self._server.server_close()
+            self._server = None
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+class DaemonClient:
+    def __init__(self, socket_path: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        socket_path : str, optional
+            Daemon socket path (default: `default_socket_path()`).
+        """
+        self.socket_path = socket_path or default_socket_path()
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(self.socket_path)
+        self._stream = self.socket.makefile('rb')
+        self._boards = None
+
+    def close(self) -> None:
+        self._stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def request(self, opcode: int, board: int = 0,
+                payload: bytes = b'') -> bytes:
+        """
+        Send request and return response payload.
+
+        Raises
+        ------
+        IOError
+            If the daemon returned an error.
+        """
+        self.socket.sendall(HEADER.pack(opcode, board, len(payload)) +
+                            payload)
+        opcode_, status, length = HEADER.unpack(
+            _read_exactly(self._stream, HEADER.size))
+        response = _read_exactly(self._stream, length)
+        if status != STATUS_OK:
+            raise IOError(f"Daemon request 0x{opcode:02x} failed: "
+                          f"{response.decode(errors='replace')}")
+        return response
+
+    def boards(self) -> List[Tuple[int, int]]:
+        """
+        Return ``(address, shift_register_count)`` of each board served.
+        """
+        if self._boards is None:
+            data = self.request(OP_LIST_BOARDS)
+            self._boards = [(data[i], data[i + 1])
+                            for i in range(0, len(data), 2)]
+        return self._boards
+
+    def submit(self, board: int, state: Union[List, np.array]) -> None:
+        """
+        Submit state of all channels of ``board`` (returns once queued).
+        """
+        count = self.boards()[board][1]
+        self.request(OP_SUBMIT, board,
+                     (~_encode_state(state, count)).tobytes())
+
+    def submit_ports(self, board: int, ports: Union[bytes, np.array]) -> None:
+        """
+        Submit **active HIGH** port bytes of ``board`` (e.g., a row of
+        `RoutingIndex.pack`).
+        """
+        self.request(OP_SUBMIT, board,
+                     np.asarray(ports, dtype=np.uint8).tobytes())
+
+    def state(self, board: int) -> np.array:
+        """
+        Read state of all channels of ``board``.
+        """
+        data = np.frombuffer(self.request(OP_GET_STATE, board),
+                             dtype=np.uint8)
+        return np.unpackbits(data, bitorder='little')
+
+    def stats(self, board: int) -> np.void:
+        """
+        Read firmware performance counters of ``board`` (see
+        `HVSwitchingBoard.stats`).
+        """
+        data = self.request(OP_GET_STATS, board)
+        return np.frombuffer(data, dtype=STATS_DTYPE).copy()[0]
+
+    def flush(self) -> None:
+        """
+        Wait until all frames submitted so far are written.
+        """
+        self.request(OP_FLUSH)
+
+
+def serve(boards: Sequence[HVSwitchingBoard],
+          socket_path: Optional[str] = None) -> None:
+    """
+    Serve ``boards`` until interrupted.
+    """
+    daemon = HVSwitchingBoardDaemon(boards, socket_path)
+    daemon.start()
+    logger.info(f'Serving {len(daemon.boards)} board(s) on '
+                f'`{daemon.socket_path}`')
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
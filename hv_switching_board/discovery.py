@@ -0,0 +1,285 @@
+# coding: utf-8
+"""
+Discover switching boards on one or more I2C buses, and keep a persistent
+registry of the fleet so later startups only need to validate it.
+
+Buses are named by the caller (e.g., by serial port of each proxy)::
+
+    proxies = {'COM3': proxy_a, 'COM4': proxy_b}
+    fleet = load_fleet(proxies)
+    boards = make_boards(proxies, fleet)
+
+Each bus is probed by its own thread; boards on the same bus are probed one
+after the other, since a proxy handles one I2C transaction at a time.
+
+The registry is a versioned JSON file::
+
+    {"version": 2,
+     "buses": {"<bus>": {"scan": [<address>, ...],
+                         "boards": [{"address": 32, "name": ...}, ...]}}}
+
+A bus entry is valid as long as an I2C scan of the bus returns the same
+addresses, and each registered board still reports the same serial number
+(a single short command per board), so swapped boards are detected.  When a
+bus is rediscovered, only boards at new addresses (or with a different serial
+number) are fully identified.
+
+.. versionadded:: 4.2
+"""
+import json
+import os
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Iterable
+
+from base_node_rpc import proxy as Proxy
+
+from .driver import HVSwitchingBoard
+from .topology import default_cache_filename, write_json
+
+logger = logging.getLogger(__name__)
+
+#: Layout version of registry file.
+REGISTRY_VERSION = 2
+#: Addresses skipped by default (i.e., the shared bootloader address).
+DEFAULT_EXCLUDE = (0x29, )
+
+
+def default_registry_filename() -> str:
+    """
+    Return default fleet registry file path (next to the topology cache).
+    """
+    return os.path.join(os.path.dirname(default_cache_filename()),
+                        'fleet.json')
+
+
+def _decode(value: bytes) -> str:
+    return bytes(value).split(b'\0')[0].decode('ascii', 'replace')
+
+
+def scan(proxy: Proxy) -> List[int]:
+    """
+    Return sorted addresses of all devices responding on the bus.
+    """
+    return sorted(int(a) for a in proxy.i2c_scan())
+
+
+def ping(proxy: Proxy, address: int) -> int:
+    """
+    Return serial number of board at ``address`` (a single short command).
+    """
+    return int(HVSwitchingBoard(proxy, address).serial_number)
+
+
+def identify(proxy: Proxy, address: int) -> Dict:
+    """
+    Identify switching board at ``address``.
+
+    Returns
+    -------
+    dict
+        ``address``, ``name``, ``serial_number``, ``hardware_version``,
+        ``software_version``, ``shift_register_count`` and ``capabilities`` of
+        the board.
+
+    Raises
+    ------
+    IOError
+        If the device does not respond like a switching board.
+    """
+    board = HVSwitchingBoard(proxy, address)
+    name = board.name()
+    if not name:
+        raise IOError(f"No device name returned by device at {address}")
+    return {'address': address,
+            'name': _decode(name),
+            'serial_number': int(board.serial_number),
+            'hardware_version': _decode(board.hardware_version()),
+            'software_version': _decode(board.software_version()),
+            'shift_register_count': board.get_shift_register_count(),
+            'capabilities': board.capabilities}
+
+
+def discover_bus(proxy: Proxy, addresses: Optional[Iterable[int]] = None,
+                 exclude: Iterable[int] = DEFAULT_EXCLUDE,
+                 known: Optional[Dict] = None) -> Dict:
+    """
+    Discover switching boards on a single bus.
+
+    Parameters
+    ----------
+    proxy : base_node_rpc.Proxy
+    addresses : list, optional
+        Addresses to probe (default: all addresses found by I2C scan).
+    exclude : list, optional
+        Addresses to skip (default: `DEFAULT_EXCLUDE`).
+    known : dict, optional
+        Previous registry bus entry.  Boards still at the same address with
+        the same serial number (see `ping()`) are reused without being
+        identified again.
+
+    Returns
+    -------
+    dict
+        Registry bus entry: ``scan`` (addresses found by I2C scan) and
+        ``boards`` (see `identify()`).
+    """
+    scanned = scan(proxy)
+    known_boards = {board['address']: board
+                    for board in (known or {}).get('boards', [])}
+    boards = []
+    for address in (scanned if addresses is None else addresses):
+        if address in exclude:
+            continue
+        try:
+            board = known_boards.get(address)
+            if board is None or \
+                    ping(proxy, address) != board.get('serial_number'):
+                board = identify(proxy, address)
+            boards.append(board)
+        except Exception as exception:
+            logger.debug(f'Skip device at {address}: {exception}')
+    return {'scan': scanned, 'boards': boards}
+
+
+def discover(proxies: Dict[str, Proxy],
+             exclude: Iterable[int] = DEFAULT_EXCLUDE,
+             known: Optional[Dict[str, Dict]] = None) -> Dict[str, Dict]:
+    """
+    Discover switching boards on several buses concurrently (one thread per
+    bus).
+
+    ``known`` previous registry bus entries are passed on to
+    `discover_bus()`.
+
+    Returns
+    -------
+    dict
+        Registry bus entry (see `discover_bus()`) of each bus.
+    """
+    if not proxies:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(proxies)) as executor:
+        futures = {bus: executor.submit(discover_bus, proxy,
+                                        exclude=exclude,
+                                        known=(known or {}).get(bus))
+                   for bus, proxy in proxies.items()}
+        return {bus: future.result() for bus, future in futures.items()}
+
+
+class FleetRegistry:
+    def __init__(self, filename: Optional[str] = None):
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            Registry file path (default: `default_registry_filename()`).
+        """
+        self.filename = filename or default_registry_filename()
+
+    def load(self) -> Dict[str, Dict]:
+        """
+        Return registry bus entries (empty if registry is missing, unreadable
+        or of an unsupported version).
+        """
+        try:
+            with open(self.filename, 'r') as input_:
+                data = json.load(input_)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as exception:
+            logger.debug(f'Ignore unreadable registry `{self.filename}`: '
+                         f'{exception}')
+            return {}
+        if not isinstance(data, dict) or \
+                data.get('version') != REGISTRY_VERSION:
+            logger.debug(f'Ignore registry `{self.filename}` with unsupported '
+                         f'version')
+            return {}
+        return data.get('buses', {})
+
+    def save(self, buses: Dict[str, Dict]) -> None:
+        """
+        Write registry bus entries (replacing the whole registry).
+        """
+        write_json(self.filename, {'version': REGISTRY_VERSION,
+                                   'buses': buses})
+
+    @staticmethod
+    def validate(proxy: Proxy, entry: Dict) -> bool:
+        """
+        Return ``True`` if a single I2C scan of the bus matches the registry
+        bus entry, and each registered board still has the same serial number
+        (see `ping()`), e.g., boards were not swapped.
+        """
+        try:
+            if scan(proxy) != list(entry.get('scan', [])):
+                return False
+            for board in entry.get('boards', []):
+                if ping(proxy, board['address']) != \
+                        board.get('serial_number'):
+                    logger.debug(f"Board at {board['address']} changed.")
+                    return False
+            return True
+        except Exception as exception:
+            logger.debug(f'Validation failed: {exception}')
+            return False
+
+
+def load_fleet(proxies: Dict[str, Proxy],
+               registry: Optional[FleetRegistry] = None,
+               rediscover: bool = False,
+               exclude: Iterable[int] = DEFAULT_EXCLUDE) -> Dict[str, Dict]:
+    """
+    Load fleet from registry, rediscovering (concurrently) only buses whose
+    registry entry is missing or no longer valid (see
+    `FleetRegistry.validate()`).
+
+    Parameters
+    ----------
+    proxies : dict
+        Proxy of each bus, keyed by a stable bus name.
+    registry : FleetRegistry, optional
+        Fleet registry (default: registry at `default_registry_filename()`).
+    rediscover : bool, optional
+        Rediscover all buses, ignoring the registry.
+    exclude : list, optional
+        Addresses to skip (default: `DEFAULT_EXCLUDE`).
+
+    Returns
+    -------
+    dict
+        Registry bus entry of each bus.
+    """
+    registry = registry or FleetRegistry()
+    buses = registry.load()
+    if rediscover:
+        stale = dict(proxies)
+    else:
+        # Validate buses concurrently as well.
+        with ThreadPoolExecutor(max_workers=max(1, len(proxies))) as executor:
+            valid = {bus: executor.submit(registry.validate, proxy,
+                                          buses[bus])
+                     for bus, proxy in proxies.items() if bus in buses}
+            stale = {bus: proxy for bus, proxy in proxies.items()
+                     if bus not in valid or not valid[bus].result()}
+    if stale:
+        logger.info(f'Discover boards on bus(es): {", ".join(stale)}')
+        buses.update(discover(stale, exclude=exclude,
+                              known=None if rediscover else buses))
+        registry.save(buses)
+    return {bus: buses[bus] for bus in proxies}
+
+
+def make_boards(proxies: Dict[str, Proxy],
+                fleet: Dict[str, Dict]) -> Dict[str, List[HVSwitchingBoard]]:
+    """
+    Create a driver for each board in the fleet, with known shift register
+    count (i.e., without querying the boards).
+    """
+    return {bus: [HVSwitchingBoard(proxies[bus], board['address'],
+                                   shift_register_count=board[
+                                       'shift_register_count'])
+                  for board in fleet[bus]['boards']]
+            for bus in fleet}
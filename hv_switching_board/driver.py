@@ -1,15 +1,22 @@
 # coding: utf-8
 import time
+import struct
 import logging
+import threading
+import weakref
+
+from contextlib import contextmanager
 
 import numpy as np
 
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict, Tuple
 
 from base_node_rpc import proxy as Proxy
 from base_node.driver import BaseNode, CONFIG_DTYPE
 from base_node_rpc.bootloader_driver import TwiBootloader
 
+from .topology import TopologyCache
+
 logger = logging.getLogger(__name__)
 
 CMD_SET_STATE_OF_ALL_CHANNELS = 0xA0
@@ -17,12 +24,337 @@ CMD_GET_STATE_OF_ALL_CHANNELS = 0xA1
 CMD_REBOOT = 0xA2
 CMD_RESET_CONFIG = 0xA3
 CMD_GET_SHIFT_REGISTER_COUNT = 0xA6
+CMD_GET_STATS = 0xA7
+CMD_RESET_STATS = 0xA8
+CMD_ECHO = 0xA9
+CMD_SINK = 0xAA
+CMD_SOURCE = 0xAB
+CMD_GET_BUS_SETTINGS = 0xAC
+CMD_SET_I2C_RATE = 0xAD
+CMD_SET_BAUD_RATE = 0xAE
+CMD_GET_FRAME_STATUS = 0xAF
+CMD_PLAY_BURST = 0xB0
+CMD_SAVE_PATTERN = 0xB1
+CMD_RECALL_PATTERN = 0xB2
+CMD_SET_PATTERN = 0xB3
+CMD_GET_PATTERN = 0xB4
+CMD_ACTUATE_FOR = 0xB5
+CMD_CANCEL_TIMERS = 0xB6
+CMD_GET_ON_TIME = 0xB7
+CMD_RESET_ON_TIME = 0xB8
+CMD_SET_GROUPS = 0xB9
+CMD_GET_GROUPS = 0xBA
+CMD_GROUP_SET_STATE = 0xBB
+CMD_GROUP_CLEAR = 0xBC
+CMD_GET_CAPABILITIES = 0xBD
+
+#: PCA9505 output port register of first port (emulated by all firmware).
+#:
+#: .. versionadded:: 4.2
+PCA9505_OUTPUT_PORT_REGISTER = 0x08
+#: PCA9505 auto-increment flag of register (i.e., command) byte.
+#:
+#: .. versionadded:: 4.2
+PCA9505_AUTO_INCREMENT = 0x80
+
+# Feature flags reported by `CMD_GET_CAPABILITIES` (see
+# `HVSwitchingBoard.capabilities`).
+CAP_STATS = 1 << 0
+CAP_BENCHMARK = 1 << 1
+CAP_BUS_SETTINGS = 1 << 2
+CAP_STATE_OF_ALL_CHANNELS = 1 << 3
+CAP_SEQUENCED_FRAMES = 1 << 4
+CAP_BURST = 1 << 5
+CAP_PATTERNS = 1 << 6
+CAP_TIMERS = 1 << 7
+CAP_ON_TIME = 1 << 8
+CAP_GROUPS = 1 << 9
+CAP_SERIAL_FRAMES = 1 << 10
+CAP_SHIFT_REGISTER_COUNT = 1 << 11
+
+#: Maximum payload of a single I2C transfer (the firmware `Wire` buffer is 32
+#: bytes, one of which is used by the command byte or return code).
+#:
+#: .. versionadded:: 4.2
+MAX_I2C_PAYLOAD = 31
+
+#: Number of pattern slots stored on the board.
+#:
+#: .. versionadded:: 4.2
+PATTERN_SLOT_COUNT = 8
+#: Maximum length of a pattern name.
+#:
+#: .. versionadded:: 4.2
+PATTERN_NAME_LENGTH = 8
+
+#: Number of auto-off timers on the board (see `HVSwitchingBoard.actuate_for`).
+#:
+#: .. versionadded:: 4.2
+TIMER_COUNT = 8
+
+#: Switching board CPU clock frequency (Hz).
+F_CPU = 8000000
+#: Minimum I2C rate (i.e., `TWBR = 255`) supported by the board.
+MIN_I2C_RATE = -(-F_CPU // (16 + 2 * 255))
+#: Maximum I2C rate (fast mode) supported by the board.
+MAX_I2C_RATE = 400000
+#: Minimum serial baud rate supported by the board.
+MIN_BAUD_RATE = 1200
+#: Maximum serial baud rate (double-speed UART) supported by the board.
+MAX_BAUD_RATE = F_CPU // 8
+
+
+def validate_i2c_rate(rate: int) -> None:
+    """
+    Raise `ValueError` if I2C rate is not supported by the board clock.
+
+    .. versionadded:: 4.2
+    """
+    if not MIN_I2C_RATE <= rate <= MAX_I2C_RATE:
+        raise ValueError(f"I2C rate {rate} Hz is outside supported range "
+                         f"[{MIN_I2C_RATE}, {MAX_I2C_RATE}] Hz")
+
+
+def validate_baud_rate(baud_rate: int) -> None:
+    """
+    Raise `ValueError` if baud rate is not supported by the board clock.
+
+    A baud rate is supported if the UART baud rate error is at most 2.5%.  For
+    example, with an **8 MHz clock**, 57600 and 250000 are supported, but
+    115200 is **not**.
+
+    .. versionadded:: 4.2
+    """
+    if not MIN_BAUD_RATE <= baud_rate <= MAX_BAUD_RATE:
+        raise ValueError(f"Baud rate {baud_rate} is outside supported range "
+                         f"[{MIN_BAUD_RATE}, {MAX_BAUD_RATE}]")
+    # Same calculation as Arduino `HardwareSerial::begin()` (double-speed).
+    setting = (F_CPU // 4 // baud_rate - 1) // 2
+    actual = F_CPU // (8 * (setting + 1))
+    if abs(actual - baud_rate) * 40 > baud_rate:
+        raise ValueError(f"Baud rate {baud_rate} is not supported by "
+                         f"{F_CPU / 1e6:g} MHz clock (actual rate: {actual})")
+
+
+def _crc8_table() -> List[int]:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) if crc & 0x80 else (crc << 1)
+        table.append(crc & 0xFF)
+    return table
+
+
+_CRC8_TABLE = _crc8_table()
+
+
+def crc8(data: Union[bytes, List[int]], crc: int = 0) -> int:
+    """
+    CRC-8 (polynomial ``0x07``, initial value ``0``), matching avr-libc
+    ``_crc8_ccitt_update()`` used by the firmware.
+
+    .. versionadded:: 4.2
+    """
+    for byte in bytearray(data):
+        crc = _CRC8_TABLE[crc ^ byte]
+    return crc
+
+
+def encode_frames(states: Union[List, np.array], shift_register_count: int,
+                  chunk_size: int = 65536,
+                  out: Optional[np.array] = None) -> np.array:
+    """
+    Pack channel states of several frames into **active LOW** port bytes (as
+    sent to board).
+
+    Frames are packed ``chunk_size`` at a time, so memory use stays bounded
+    for memory-mapped ``states`` (and ``out``).
+
+    Parameters
+    ----------
+    states : list or numpy.array
+        Array of shape ``(frame_count, channel_count)``, with at most ``8 *
+        shift_register_count`` channels (missing channels are off).
+    shift_register_count : int
+        Number of shift registers (i.e., ports) of board.
+    chunk_size : int, optional
+        Number of frames packed at a time.
+    out : numpy.array, optional
+        ``uint8`` output array of shape ``(frame_count,
+        shift_register_count)`` (e.g., a `numpy.memmap`).
+
+    Returns
+    -------
+    numpy.array
+        ``uint8`` port bytes of shape ``(frame_count, shift_register_count)``.
+
+    .. versionadded:: 4.2
+    """
+    if not isinstance(states, np.ndarray):
+        states = np.asarray(states)
+    frame_count, channel_count = states.shape
+    if channel_count > 8 * shift_register_count:
+        raise ValueError(f"Expected at most {8 * shift_register_count} "
+                         f"channels, got {channel_count}")
+    if out is None:
+        out = np.empty((frame_count, shift_register_count), dtype=np.uint8)
+    bits = np.zeros((min(chunk_size, frame_count), 8 * shift_register_count),
+                    dtype=bool)
+    for i in range(0, frame_count, chunk_size):
+        chunk = states[i:i + chunk_size]
+        bits_i = bits[:len(chunk)]
+        np.not_equal(chunk, 0, out=bits_i[:, :channel_count])
+        out[i:i + len(chunk)] = ~np.packbits(bits_i, axis=1,
+                                             bitorder='little')
+    return out
+
+
+def decode_frames(data: Union[List, np.array], shift_register_count: int,
+                  chunk_size: int = 65536,
+                  out: Optional[np.array] = None) -> np.array:
+    """
+    Unpack **active LOW** port bytes of several frames (see
+    `encode_frames()`) into channel states.
+
+    Parameters
+    ----------
+    data : list or numpy.array
+        Array of shape ``(frame_count, shift_register_count)``.
+    shift_register_count : int
+        Number of shift registers (i.e., ports) of board.
+    chunk_size : int, optional
+        Number of frames unpacked at a time.
+    out : numpy.array, optional
+        ``uint8`` output array of shape ``(frame_count, 8 *
+        shift_register_count)`` (e.g., a `numpy.memmap`).
+
+    Returns
+    -------
+    numpy.array
+        ``uint8`` channel states of shape ``(frame_count, 8 *
+        shift_register_count)``.
+
+    .. versionadded:: 4.2
+    """
+    if not isinstance(data, np.ndarray):
+        data = np.asarray(data, dtype=np.uint8)
+    frame_count = len(data)
+    if out is None:
+        out = np.empty((frame_count, 8 * shift_register_count),
+                       dtype=np.uint8)
+    for i in range(0, frame_count, chunk_size):
+        chunk = np.asarray(data[i:i + chunk_size, :shift_register_count],
+                           dtype=np.uint8)
+        out[i:i + len(chunk)] = np.unpackbits(~chunk, axis=1,
+                                              bitorder='little')
+    return out
+
+
+def _encode_state(state: Union[List, np.array],
+                  shift_register_count: int) -> np.array:
+    """
+    Pack channel states into **active LOW** port bytes (as sent to board).
+    """
+    return encode_frames(np.asarray(state).reshape(1, -1),
+                         shift_register_count)[0]
+
+
+def _decode_state(data: Union[bytes, List[int]],
+                  shift_register_count: int) -> np.array:
+    """
+    Unpack **active LOW** port bytes (as sent by board) into channel states.
+    """
+    data = np.array(list(data[:shift_register_count]), dtype=np.uint8)
+    return decode_frames(data[None], shift_register_count)[0]
+
+
+def _check_group_mask(mask: int) -> None:
+    if not 0 <= mask <= 0xFF:
+        raise ValueError('Group mask must be in range [0, 255].')
+
+
+def group_set_state(proxy: Proxy, mask: int, state: Union[List, np.array],
+                    shift_register_count: int = 5) -> None:
+    """
+    Set state of all channels on every board in any of the groups in
+    ``mask``, in a single I2C broadcast.
+
+    Boards must have I2C broadcast receiving enabled (the default) and the
+    same number of shift registers.
+
+    Parameters
+    ----------
+    proxy : base_node_rpc.Proxy
+    mask : int
+        Group mask (see `HVSwitchingBoard.set_groups`).
+    state : list or numpy.array
+        State of each channel.
+    shift_register_count : int, optional
+        Number of shift registers on each board (default: 5).
+
+    .. versionadded:: 4.2
+    """
+    _check_group_mask(mask)
+    data = [CMD_GROUP_SET_STATE, mask] + \
+        _encode_state(state, shift_register_count).tolist()
+    with _bus_lock(proxy):
+        proxy.i2c_write(0, data)
+
+
+def group_clear(proxy: Proxy, mask: int) -> None:
+    """
+    Turn off all channels on every board in any of the groups in ``mask``,
+    in a single I2C broadcast.
+
+    .. versionadded:: 4.2
+    """
+    _check_group_mask(mask)
+    with _bus_lock(proxy):
+        proxy.i2c_write(0, [CMD_GROUP_CLEAR, mask])
+
+
+# Negotiated ``(capabilities, shift_register_count)`` of each proxy (i.e.,
+# bus), keyed by ``(address, software_version)``; entries are dropped with
+# the proxy.
+_CAPABILITIES_CACHE: 'weakref.WeakKeyDictionary[Proxy, Dict]' = \
+    weakref.WeakKeyDictionary()
+
+# Lock of each proxy (i.e., bus), shared by all boards on the bus and by
+# broadcasts (see `HVSwitchingBoard.send_command()`).
+_BUS_LOCKS: 'weakref.WeakKeyDictionary[Proxy, threading.RLock]' = \
+    weakref.WeakKeyDictionary()
+_BUS_LOCKS_LOCK = threading.Lock()
+
+
+def _bus_lock(proxy: Proxy) -> threading.RLock:
+    with _BUS_LOCKS_LOCK:
+        return _BUS_LOCKS.setdefault(proxy, threading.RLock())
+
+
+#: Firmware performance counters, as returned by `CMD_GET_STATS`.
+#:
+#: .. versionadded:: 4.2
+STATS_DTYPE = np.dtype([('port_writes', '<u2'),
+                        ('port_reads', '<u2'),
+                        ('config_commands', '<u2'),
+                        ('board_commands', '<u2'),
+                        ('base_commands', '<u2'),
+                        ('update_count', '<u4'),
+                        ('update_last_us', '<u2'),
+                        ('update_max_us', '<u2'),
+                        ('general_errors', '<u2'),
+                        ('unknown_commands', '<u2'),
+                        ('wire_overruns', '<u2'),
+                        ('loop_rate', '<u4'),
+                        ('free_ram', '<u2')])
 
 
 class HVSwitchingBoard(BaseNode):
     def __init__(self, proxy: Proxy, address: int,
                  bootloader_address: Optional[int] = 0x29,
-                 shift_register_count: int = 5):
+                 shift_register_count: Optional[int] = None,
+                 topology_cache: Optional[TopologyCache] = None):
         """
         Parameters
         ----------
@@ -32,12 +364,56 @@ class HVSwitchingBoard(BaseNode):
         bootloader_address : int, optional
             I2C address of bootloader (default: 0x29).
         shift_register_count : int, optional
-            Number of shift registers on the board (default: 5).
+            Number of shift registers on the board (default: detect on first
+            use).
+        topology_cache : TopologyCache, optional
+            Persistent cache of detected shift register counts.
+
+        .. versionchanged:: 4.2
+            Detect shift register count on first use by default.  Add
+            ``topology_cache`` argument.
         """
         super().__init__(proxy, address)
         self.bootloader_address = bootloader_address
         self.bootloader = TwiBootloader(self.proxy, self.bootloader_address)
+        self.topology_cache = topology_cache
         self.shift_register_count = shift_register_count
+        # Sequence number of last frame written by `write_frame()`.
+        self._sequence = None
+        # Frame status at last confirmation (see `confirm_frames()`).
+        self._confirmed_status = None
+        # Pattern slot of each pattern name (see `list_patterns()`).
+        self._pattern_slots = None
+        # Negotiated `(capabilities, shift_register_count)` (see
+        # `_negotiate()`).
+        self._capabilities = None
+        #: Coalescing window in seconds (see `set_state_of_all_channels()`);
+        #: ``None`` to write immediately.
+        self.coalesce_window = None
+        #: `set_state_of_all_channels()` calls (``requested``), writes
+        #: issued (``written``), and writes saved by coalescing (``saved``).
+        self.write_counters = {'requested': 0, 'written': 0, 'saved': 0}
+        self._pending_state = None
+        # Error of last deferred write on the timer thread (raised by the
+        # next call, see `flush()`).
+        self._coalesce_error = None
+        self._batch_depth = 0
+        self._coalesce_timer = None
+        self._coalesce_lock = threading.RLock()
+        # Serializes bus access, since deferred writes may be issued from the
+        # coalescing timer thread.
+        self._bus_lock = _bus_lock(proxy)
+
+    def send_command(self, cmd: int) -> None:
+        """
+        Send command (see `base_node.driver.BaseNode.send_command`).
+
+        .. versionchanged:: 4.2
+            Hold the bus lock (shared by all boards on the proxy) during the
+            transaction.
+        """
+        with self._bus_lock:
+            super().send_command(cmd)
 
     def set_i2c_address(self, address: int) -> None:
         """
@@ -56,6 +432,7 @@ class HVSwitchingBoard(BaseNode):
         config['i2c_address'] = address
         self.write_config(config)
         self.address = address
+        self._invalidate_topology()
         self.bootloader.start_application()
 
     def reset_config(self) -> None:
@@ -66,9 +443,59 @@ class HVSwitchingBoard(BaseNode):
             This resets the I2C address of the switching board to **10**.
 
         .. versionadded:: 0.10
+
+        .. versionchanged:: 4.2
+            Also resets I2C rate and baud rate settings to their defaults.
         """
-        self.proxy.i2c_write(self.address, [CMD_RESET_CONFIG])
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address, [CMD_RESET_CONFIG])
+        self._invalidate_topology()
         self.address = 10
+        self._invalidate_topology()
+
+    @property
+    def shift_register_count(self) -> int:
+        """
+        Number of shift registers on the board.
+
+        Unless set explicitly, detected on first use (using the topology
+        cache, if available) and memoized until the board is rebooted or
+        readdressed.
+
+        .. versionchanged:: 4.2
+            Detect on first use if not set (or set to ``None``).
+        """
+        if self._shift_register_count is None:
+            count = None
+            if self.topology_cache is not None:
+                count = self.topology_cache.shift_register_count(self.address)
+            if count is None:
+                count = self.get_shift_register_count()
+                if self.topology_cache is not None:
+                    self.topology_cache.update(self.address,
+                                               shift_register_count=count)
+            self._shift_register_count = count
+        return self._shift_register_count
+
+    @shift_register_count.setter
+    def shift_register_count(self, value: Optional[int]) -> None:
+        # Explicit count, or `None` to detect on first use.
+        self._fixed_shift_register_count = value
+        self._shift_register_count = value
+
+    def _invalidate_topology(self) -> None:
+        """
+        Forget negotiated capabilities and detected shift register count of
+        board at current address (e.g., after reboot).
+        """
+        self._capabilities = None
+        cache = _CAPABILITIES_CACHE.get(self.proxy, {})
+        for key in [key for key in cache if key[0] == self.address]:
+            del cache[key]
+        if self._fixed_shift_register_count is None:
+            self._shift_register_count = None
+        if self.topology_cache is not None:
+            self.topology_cache.invalidate(self.address)
 
     def get_shift_register_count(self) -> int:
         """
@@ -80,11 +507,224 @@ class HVSwitchingBoard(BaseNode):
             Number of shift registers available on this board.
 
         .. versionadded:: 4.1
+
+        .. versionchanged:: 4.2
+            Negotiated once with `capabilities` and cached.
+        """
+        return self._negotiate()[1]
+
+    @property
+    def capabilities(self) -> int:
         """
-        self.send_command(CMD_GET_SHIFT_REGISTER_COUNT)
+        Bit mask of ``CAP_*`` features supported by the board firmware
+        (``0`` for firmware before 4.2).
+
+        Capabilities are negotiated on first use and cached per proxy, board
+        address and firmware version.
+
+        .. versionadded:: 4.2
+        """
+        return self._negotiate()[0]
+
+    def supports(self, capability: int) -> bool:
+        """
+        Return ``True`` if the board firmware supports all ``CAP_*`` features
+        in ``capability``.
+
+        .. versionadded:: 4.2
+        """
+        return self.capabilities & capability == capability
+
+    def _require(self, capability: int) -> None:
+        if not self.supports(capability):
+            raise IOError(f"Firmware at {self.address} does not support "
+                          f"capability 0x{capability:x}")
+
+    def _negotiate(self) -> Tuple[int, int]:
+        if self._capabilities is None:
+            cache = _CAPABILITIES_CACHE.setdefault(self.proxy, {})
+            key = (self.address, bytes(self.software_version()))
+            if key not in cache:
+                cache[key] = self._query_capabilities()
+            self._capabilities = cache[key]
+        return self._capabilities
+
+    def _query_capabilities(self) -> Tuple[int, int]:
+        try:
+            self.send_command(CMD_GET_CAPABILITIES)
+        except IOError:
+            self.data = []
+        if len(self.data) >= 5:
+            capabilities = self.read_uint32()
+            return capabilities, self.read_uint8()
+        # Firmware before 4.2 (e.g., hardware version 2/3 builds).
+        try:
+            self.send_command(CMD_GET_SHIFT_REGISTER_COUNT)
+        except IOError:
+            self.data = []
         if self.data:
-            return self.read_uint8()
-        return 5  # Default fallback for older firmware
+            return 0, self.read_uint8()
+        return 0, 5  # Default fallback for older firmware
+
+    def stats(self) -> np.void:
+        """
+        Read firmware performance counters.
+
+        Returns
+        -------
+        numpy.void
+            Counters as a `STATS_DTYPE` record, e.g., ``stats['update_max_us']``.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_GET_STATS)
+        data = self._data_bytes()
+        if len(data) < STATS_DTYPE.itemsize:
+            raise IOError(f"Stats read returned {len(data)} bytes, expected "
+                          f"{STATS_DTYPE.itemsize} — firmware at "
+                          f"{self.address} may not support `CMD_GET_STATS`")
+        return np.frombuffer(data[:STATS_DTYPE.itemsize],
+                             dtype=STATS_DTYPE).copy()[0]
+
+    def reset_stats(self) -> None:
+        """
+        Reset firmware performance counters.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_RESET_STATS)
+
+    def bus_settings(self) -> Dict[str, int]:
+        """
+        Read I2C clock rate and serial baud rate settings.
+
+        Returns
+        -------
+        dict
+            ``i2c_rate`` (Hz) and ``baud_rate``.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_GET_BUS_SETTINGS)
+        data = self._data_bytes()
+        if len(data) < 8:
+            raise IOError(f"Bus settings read returned {len(data)} bytes, "
+                          f"expected 8 — firmware at {self.address} may not "
+                          f"support `CMD_GET_BUS_SETTINGS`")
+        i2c_rate, baud_rate = struct.unpack('<II', data[:8])
+        return {'i2c_rate': i2c_rate, 'baud_rate': baud_rate}
+
+    def set_i2c_rate(self, rate: int) -> None:
+        """
+        Set I2C clock rate in EEPROM settings.  Takes effect immediately.
+
+        Parameters
+        ----------
+        rate : int
+            I2C clock rate (Hz).
+
+        Raises
+        ------
+        ValueError
+            If rate is not supported by the board clock.
+
+        .. versionadded:: 4.2
+        """
+        validate_i2c_rate(rate)
+        self.serialize_uint32(rate)
+        self.send_command(CMD_SET_I2C_RATE)
+
+    def set_baud_rate(self, baud_rate: int) -> None:
+        """
+        Set serial baud rate in EEPROM settings.
+
+        .. note::
+            The new baud rate takes effect **after reboot**.
+
+        Parameters
+        ----------
+        baud_rate : int
+            Serial baud rate.
+
+        Raises
+        ------
+        ValueError
+            If baud rate is not supported by the board clock.
+
+        .. versionadded:: 4.2
+        """
+        validate_baud_rate(baud_rate)
+        self.serialize_uint32(baud_rate)
+        self.send_command(CMD_SET_BAUD_RATE)
+
+    def echo(self, data: Union[bytes, List[int]]) -> bytes:
+        """
+        Send payload to the board and read it back, without touching outputs.
+
+        Parameters
+        ----------
+        data : bytes or list
+            Payload (at most `MAX_I2C_PAYLOAD` bytes).
+
+        Returns
+        -------
+        bytes
+            Payload echoed by the board.
+
+        .. versionadded:: 4.2
+        """
+        self._check_payload_size(len(data))
+        self.write_buffer.extend(bytearray(data))
+        self.send_command(CMD_ECHO)
+        return self._data_bytes()
+
+    def sink(self, data: Union[bytes, List[int]]) -> None:
+        """
+        Send payload to the board, which discards it without touching outputs.
+
+        Parameters
+        ----------
+        data : bytes or list
+            Payload (at most `MAX_I2C_PAYLOAD` bytes).
+
+        .. versionadded:: 4.2
+        """
+        self._check_payload_size(len(data))
+        self.write_buffer.extend(bytearray(data))
+        self.send_command(CMD_SINK)
+
+    def source(self, count: int) -> bytes:
+        """
+        Read payload generated by the board, without touching outputs.
+
+        Parameters
+        ----------
+        count : int
+            Number of bytes to read (at most `MAX_I2C_PAYLOAD`).
+
+        Returns
+        -------
+        bytes
+            ``count`` bytes (``0, 1, ..., count - 1``).
+
+        .. versionadded:: 4.2
+        """
+        self._check_payload_size(count)
+        self.serialize_uint8(count)
+        self.send_command(CMD_SOURCE)
+        return self._data_bytes()
+
+    @staticmethod
+    def _check_payload_size(size: int) -> None:
+        if size > MAX_I2C_PAYLOAD:
+            raise ValueError(f"Payload of {size} bytes exceeds maximum of "
+                             f"{MAX_I2C_PAYLOAD} bytes per I2C transfer")
+
+    def _data_bytes(self) -> bytes:
+        """
+        Return response to last command (i.e., `self.data`) as `bytes`.
+        """
+        return bytes(bytearray(self.data))
 
     def read_config(self) -> CONFIG_DTYPE:
         """
@@ -115,10 +755,18 @@ class HVSwitchingBoard(BaseNode):
         self.bootloader.write_eeprom(0, list(config.tobytes()))
 
     def reboot_recovery(self) -> None:
-        self.proxy.i2c_write(self.address, CMD_REBOOT)
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address, CMD_REBOOT)
+        # Frame sequence restarts after reboot (and firmware may be updated
+        # from the bootloader).
+        self._sequence = None
+        self._pattern_slots = None
+        self._invalidate_topology()
 
         for i in range(10 * 200):
-            if self.bootloader_address in self.proxy.i2c_scan():
+            with self._bus_lock:
+                found = self.bootloader_address in self.proxy.i2c_scan()
+            if found:
                 logger.debug(f'Found device at {self.bootloader_address}')
                 self.bootloader.abort_boot_timeout()
                 logger.debug('Aborted timeout to stay in bootloader')
@@ -127,19 +775,633 @@ class HVSwitchingBoard(BaseNode):
         raise IOError(f"Bootloader at {self.bootloader_address} did not "
                       f"appear after rebooting board at {self.address}")
 
+    def write_ports(self, ports: Union[List[int], np.array],
+                    start: int = 0) -> None:
+        """
+        Write consecutive output ports in a single write-only transfer.
+
+        Uses the PCA9505 auto-increment register write emulated by all
+        firmware versions.
+
+        Parameters
+        ----------
+        ports : list or numpy.array
+            **Active HIGH** state byte of each port (bit ``i`` of port ``p``
+            is channel ``8 * p + i``).
+        start : int, optional
+            First port to write.
+
+        .. versionadded:: 4.2
+        """
+        # Write deferred state first, so it cannot override these ports.
+        self.flush()
+        self._write_ports(ports, start)
+
+    def write_raw(self, data: Union[List[int], np.array]) -> None:
+        """
+        Write raw bytes (e.g., command byte and payload) to the board in a
+        single write-only transfer, holding the bus lock.
+
+        Deferred state (see `flush()`) is written first.
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address, data)
+
+    def _write_ports(self, ports: Union[List[int], np.array],
+                     start: int = 0) -> None:
+        ports = np.asarray(ports, dtype=np.uint8)
+        if not 0 <= start or start + len(ports) > self.shift_register_count:
+            raise ValueError(f"Ports {start}..{start + len(ports) - 1} out of "
+                             f"range for {self.shift_register_count} ports")
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address,
+                                 [PCA9505_AUTO_INCREMENT |
+                                  (PCA9505_OUTPUT_PORT_REGISTER + start)] +
+                                 (~ports).tolist())
+
     def set_state_of_all_channels(self, state: Union[List, np.array]) -> None:
-        data = np.array([0] * self.shift_register_count, dtype=np.uint8)
-        for i in range(len(state)):
-            data[i // 8] |= (state[i] << (i % 8))
-        for i in range(self.shift_register_count):
-            self.serialize_uint8(~data[i])
-        self.send_command(CMD_SET_STATE_OF_ALL_CHANNELS)
+        """
+        Set state of all channels.
+
+        Inside a `batch()` block, or if `coalesce_window` is set, the write is
+        deferred and only the final state of all calls within the block (or
+        window) is written (see `write_counters`).  If a deferred write
+        fails on the coalescing timer thread, its state stays pending and the
+        error is raised by the next call.
+
+        .. versionchanged:: 4.2
+            Use a single write-only `write_ports()` transfer, which is the
+            fastest path on all firmware versions.  Use `write_frame()` for
+            checked writes.  Add optional write coalescing.
+        """
+        with self._coalesce_lock:
+            self._raise_coalesce_error()
+            self.write_counters['requested'] += 1
+            if self._pending_state is not None:
+                # Superseded by this call.
+                self.write_counters['saved'] += 1
+            if self._batch_depth or self.coalesce_window:
+                self._pending_state = np.array(state, copy=True)
+                if not self._batch_depth and self._coalesce_timer is None:
+                    self._coalesce_timer = \
+                        threading.Timer(self.coalesce_window,
+                                        self._coalesce_timeout)
+                    self._coalesce_timer.daemon = True
+                    self._coalesce_timer.start()
+                return
+            self._cancel_coalesce_timer()
+            self._write_state(state)
+            self._pending_state = None
+
+    def _write_state(self, state: Union[List, np.array]) -> None:
+        self._write_ports(~_encode_state(state, self.shift_register_count))
+        self.write_counters['written'] += 1
+
+    def _cancel_coalesce_timer(self) -> None:
+        if self._coalesce_timer is not None:
+            self._coalesce_timer.cancel()
+            self._coalesce_timer = None
+
+    def _raise_coalesce_error(self) -> None:
+        if self._coalesce_error is not None:
+            error, self._coalesce_error = self._coalesce_error, None
+            raise error
+
+    def _coalesce_timeout(self) -> None:
+        with self._coalesce_lock:
+            self._coalesce_timer = None
+            if not self._batch_depth:
+                try:
+                    self.flush()
+                except Exception as exception:
+                    logger.error(f'Deferred write to board {self.address} '
+                                 f'failed: {exception}')
+                    self._coalesce_error = exception
+
+    def flush(self) -> None:
+        """
+        Write state deferred by `batch()` or `coalesce_window`, if any.
+
+        The state is only discarded once written; if the write fails, it
+        stays pending (i.e., is retried by the next flush).
+
+        Raises
+        ------
+        Exception
+            Error of a deferred write that failed on the coalescing timer
+            thread (raised once).
+
+        .. versionadded:: 4.2
+        """
+        with self._coalesce_lock:
+            self._raise_coalesce_error()
+            self._cancel_coalesce_timer()
+            if self._pending_state is not None:
+                self._write_state(self._pending_state)
+                self._pending_state = None
+
+    def discard_pending(self) -> bool:
+        """
+        Drop state deferred by `batch()` or `coalesce_window`, if any,
+        **without** writing it (e.g., before an emergency all-off).
+
+        Returns
+        -------
+        bool
+            ``True`` if deferred state was dropped.
+
+        .. versionadded:: 4.2
+        """
+        with self._coalesce_lock:
+            self._cancel_coalesce_timer()
+            # The error of a failed deferred write refers to dropped state.
+            self._coalesce_error = None
+            discarded = self._pending_state is not None
+            self._pending_state = None
+            return discarded
+
+    @contextmanager
+    def batch(self):
+        """
+        Collapse all `set_state_of_all_channels()` calls within the block
+        into a single write of the final state, on exit::
+
+            with board.batch():
+                board.set_state_of_all_channels(a)
+                board.set_state_of_all_channels(b)  # Only `b` is written.
+
+        .. versionadded:: 4.2
+        """
+        with self._coalesce_lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._coalesce_lock:
+                self._batch_depth -= 1
+                if not self._batch_depth:
+                    self.flush()
+
+    def write_frame(self, state: Union[List, np.array]) -> int:
+        """
+        Write state of all channels as a sequenced frame, **without** waiting
+        for a response.
+
+        Several frames may be written back to back; use `confirm_frames()` to
+        verify that all of them were applied.
+
+        Parameters
+        ----------
+        state : list or numpy.array
+            State of each channel.
+
+        Returns
+        -------
+        int
+            Sequence number of frame.
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        self._require(CAP_SEQUENCED_FRAMES)
+        if self._sequence is None:
+            # Continue the board sequence, so gaps are only counted for lost
+            # frames.
+            self._confirmed_status = self.frame_status()
+            self._sequence = self._confirmed_status['sequence']
+        self._sequence = (self._sequence + 1) & 0xFF
+        frame = [self._sequence] + list(_encode_state(state,
+                                                      self.shift_register_count))
+        frame.append(crc8(frame))
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address,
+                                 [CMD_SET_STATE_OF_ALL_CHANNELS] + frame)
+        return self._sequence
+
+    def frame_status(self) -> Dict[str, int]:
+        """
+        Read outcome of sequenced frames (see `write_frame()`).
+
+        Returns
+        -------
+        dict
+            ``sequence`` (last applied), ``status`` (return code of last
+            frame), ``rejected`` (e.g., bad CRC) and ``gaps`` (frames that did
+            not follow the previous one).  Counts wrap around at 256.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_GET_FRAME_STATUS)
+        data = self._data_bytes()
+        if len(data) < 4:
+            raise IOError(f"Frame status read returned {len(data)} bytes, "
+                          f"expected 4 — firmware at {self.address} may not "
+                          f"support `CMD_GET_FRAME_STATUS`")
+        return dict(zip(('sequence', 'status', 'rejected', 'gaps'),
+                        data[:4]))
+
+    def confirm_frames(self) -> int:
+        """
+        Confirm that all frames written by `write_frame()` since the last
+        confirmation were applied, using a single status read.
+
+        Returns
+        -------
+        int
+            Sequence number of last applied frame.
+
+        Raises
+        ------
+        IOError
+            If any frame was rejected or lost.
+
+        .. versionadded:: 4.2
+        """
+        if self._sequence is None:
+            # No frames written.
+            return self.frame_status()['sequence']
+        status = self.frame_status()
+        previous, self._confirmed_status = self._confirmed_status, status
+        rejected = (status['rejected'] - previous['rejected']) & 0xFF
+        lost = (status['gaps'] - previous['gaps']) & 0xFF
+        if rejected or lost or status['sequence'] != self._sequence:
+            raise IOError(f"Board at {self.address} applied frames up to "
+                          f"{status['sequence']} (expected {self._sequence}); "
+                          f"{rejected} rejected, {lost} gap(s)")
+        return status['sequence']
+
+    def write_frames(self, states: Union[List, np.array]) -> int:
+        """
+        Write several frames back to back, then confirm all of them.
+
+        Parameters
+        ----------
+        states : list or numpy.array
+            State of each channel, one row per frame.
+
+        Returns
+        -------
+        int
+            Sequence number of last frame.
+
+        Raises
+        ------
+        IOError
+            If any frame was rejected or lost.
+
+        .. versionadded:: 4.2
+        """
+        for state in states:
+            self.write_frame(state)
+        return self.confirm_frames()
+
+    @property
+    def max_burst_frames(self) -> int:
+        """
+        Maximum number of frames per `CMD_PLAY_BURST` transfer (0 if a single
+        frame does not fit, i.e., more than ``MAX_I2C_PAYLOAD - 3`` shift
+        registers).
+
+        .. versionadded:: 4.2
+        """
+        return (MAX_I2C_PAYLOAD - 1) // (2 + self.shift_register_count)
+
+    def play_burst(self, frames: np.array,
+                   dwells: Union[int, List[int], np.array]) -> None:
+        """
+        Apply frames back to back on the board, each followed by a dwell time.
+
+        Bursts of up to `max_burst_frames` frames are sent in a single
+        transfer and timed by the board, without host jitter.  Longer bursts
+        are split into several transfers.
+
+        Parameters
+        ----------
+        frames : numpy.array
+            State of each channel, one row per frame.
+        dwells : int or list or numpy.array
+            Dwell time after each frame in microseconds (at most 65535), or a
+            single dwell time for all frames.
+
+        Raises
+        ------
+        ValueError
+            If a frame does not fit in a burst transfer (see
+            `max_burst_frames`).
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        self._require(CAP_BURST)
+        chunk_size = self.max_burst_frames
+        if chunk_size < 1:
+            raise ValueError(f"Bursts support at most "
+                             f"{MAX_I2C_PAYLOAD - 3} shift registers (board "
+                             f"at {self.address} has "
+                             f"{self.shift_register_count})")
+        frames = np.atleast_2d(frames)
+        dwells = np.broadcast_to(np.asarray(dwells), (len(frames), ))
+        if (dwells < 0).any() or (dwells > 0xFFFF).any():
+            raise ValueError('Dwell times must be in range [0, 65535] us.')
+        dwells = dwells.astype('<u2')
+
+        for start in range(0, len(frames), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            count = len(frames[chunk])
+            payload = [count] + list(dwells[chunk].tobytes())
+            for frame in frames[chunk]:
+                payload += list(_encode_state(frame,
+                                              self.shift_register_count))
+            chunk_end = time.perf_counter() + dwells[chunk].sum() * 1e-6
+            # Write only, and wait for the burst to finish: the board does
+            # not process further commands until the burst is complete.
+            with self._bus_lock:
+                self.proxy.i2c_write(self.address,
+                                     [CMD_PLAY_BURST] + payload)
+            time.sleep(max(0., chunk_end - time.perf_counter()))
+
+    @staticmethod
+    def _check_pattern_slot(slot: int) -> None:
+        if not 0 <= slot < PATTERN_SLOT_COUNT:
+            raise ValueError(f"Pattern slot must be in range [0, "
+                             f"{PATTERN_SLOT_COUNT - 1}]")
+
+    def save_pattern(self, slot: int) -> None:
+        """
+        Save current state of channels to a pattern slot on the board.
+
+        The name of the slot, if any, is kept.
+
+        Parameters
+        ----------
+        slot : int
+            Pattern slot, in range ``[0, PATTERN_SLOT_COUNT)``.
+
+        .. versionadded:: 4.2
+        """
+        self._check_pattern_slot(slot)
+        # Save the latest state, including deferred state (see `flush()`).
+        self.flush()
+        self.serialize_uint8(slot)
+        self.send_command(CMD_SAVE_PATTERN)
+
+    def upload_pattern(self, slot: int, state: Union[List, np.array],
+                       name: str = '') -> None:
+        """
+        Store a pattern (and name) in a pattern slot on the board.
+
+        Parameters
+        ----------
+        slot : int
+            Pattern slot, in range ``[0, PATTERN_SLOT_COUNT)``.
+        state : list or numpy.array
+            State of each channel.
+        name : str, optional
+            Pattern name (ASCII, at most `PATTERN_NAME_LENGTH` characters).
+
+        .. versionadded:: 4.2
+        """
+        self._check_pattern_slot(slot)
+        name_bytes = name.encode('ascii')
+        if len(name_bytes) > PATTERN_NAME_LENGTH:
+            raise ValueError(f"Pattern name must be at most "
+                             f"{PATTERN_NAME_LENGTH} characters")
+        self.serialize_uint8(slot)
+        for value in (list(_encode_state(state, self.shift_register_count)) +
+                      list(name_bytes)):
+            self.serialize_uint8(value)
+        self.send_command(CMD_SET_PATTERN)
+        self._pattern_slots = None
+
+    def erase_pattern(self, slot: int) -> None:
+        """
+        Erase a pattern slot on the board.
+
+        .. versionadded:: 4.2
+        """
+        self._check_pattern_slot(slot)
+        self.serialize_uint8(slot)
+        self.send_command(CMD_SET_PATTERN)
+        self._pattern_slots = None
+
+    def read_pattern(self, slot: int) -> Optional[Dict]:
+        """
+        Read a pattern slot from the board.
+
+        Returns
+        -------
+        dict or None
+            ``name`` and ``state`` of the pattern, or ``None`` if the slot is
+            empty.
+
+        .. versionadded:: 4.2
+        """
+        self._check_pattern_slot(slot)
+        self.serialize_uint8(slot)
+        self.send_command(CMD_GET_PATTERN)
+        data = self._data_bytes()
+        n = self.shift_register_count
+        if len(data) < 1 + n + PATTERN_NAME_LENGTH:
+            raise IOError(f"Pattern read returned {len(data)} bytes, expected "
+                          f"{1 + n + PATTERN_NAME_LENGTH}")
+        if not data[0]:
+            return None
+        name = data[1 + n:1 + n + PATTERN_NAME_LENGTH]
+        return {'name': name.split(b'\0')[0].decode('ascii', 'replace'),
+                'state': _decode_state(data[1:1 + n], n)}
+
+    def list_patterns(self) -> Dict[int, Dict]:
+        """
+        Read all stored patterns from the board.
+
+        Returns
+        -------
+        dict
+            Mapping from slot to pattern (see `read_pattern()`) for each
+            non-empty slot.
+
+        .. versionadded:: 4.2
+        """
+        patterns = {}
+        for slot in range(PATTERN_SLOT_COUNT):
+            pattern = self.read_pattern(slot)
+            if pattern is not None:
+                patterns[slot] = pattern
+        self._pattern_slots = {p['name']: slot
+                               for slot, p in patterns.items() if p['name']}
+        return patterns
+
+    def recall_pattern(self, slot: Union[int, str]) -> None:
+        """
+        Apply a stored pattern to the channels.
+
+        Recalling a pattern is a write-only, two-byte transfer, regardless of
+        the number of channels.
+
+        Parameters
+        ----------
+        slot : int or str
+            Pattern slot or pattern name.  Pattern names are resolved using
+            the slot names read by the last `list_patterns()` call (read on
+            first use).
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        self._require(CAP_PATTERNS)
+        if isinstance(slot, str):
+            if self._pattern_slots is None:
+                self.list_patterns()
+            if slot not in self._pattern_slots:
+                raise KeyError(f"No pattern named `{slot}` on board "
+                               f"{self.address}")
+            slot = self._pattern_slots[slot]
+        self._check_pattern_slot(slot)
+        with self._bus_lock:
+            self.proxy.i2c_write(self.address, [CMD_RECALL_PATTERN, slot])
+
+    def actuate_for(self, channels: Union[int, List[int], np.array],
+                    duration_ms: int) -> None:
+        """
+        Turn on channels, and have the board turn them off again after a
+        duration.
+
+        Other channels are not changed.  The board runs up to `TIMER_COUNT`
+        timers at once; a newer timer takes over channels from older timers,
+        and a later write of a channel (e.g., `set_state_of_all_channels()`)
+        cancels its pending auto-off.
+
+        Parameters
+        ----------
+        channels : int or list or numpy.array
+            Channel index or indices.
+        duration_ms : int
+            On time in milliseconds (at most 65535).
+
+        Raises
+        ------
+        IOError
+            If all board timers are in use.
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        if not 0 <= duration_ms <= 0xFFFF:
+            raise ValueError('Duration must be in range [0, 65535] ms.')
+        state = np.zeros(self.shift_register_count * 8, dtype=np.uint8)
+        state[np.atleast_1d(channels)] = 1
+        self.serialize_uint16(duration_ms)
+        for value in ~_encode_state(state, self.shift_register_count):
+            self.serialize_uint8(value)
+        self.send_command(CMD_ACTUATE_FOR)
+
+    def cancel_timers(self) -> None:
+        """
+        Cancel all auto-off timers started by `actuate_for()`.
+
+        Channels keep their current state.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_CANCEL_TIMERS)
+
+    def on_time(self) -> np.array:
+        """
+        Read accumulated on time of each channel (e.g., for electrode wear
+        tracking).
+
+        Counters are kept by the board, and read in chunks of up to 7
+        channels per transfer.  Deferred state (see `flush()`) is written
+        first.
+
+        Returns
+        -------
+        numpy.array
+            On time of each channel in milliseconds (``uint32``).
+
+        .. versionadded:: 4.2
+        """
+        self.flush()
+        channel_count = self.shift_register_count * 8
+        chunk_size = MAX_I2C_PAYLOAD // 4
+        on_time = np.zeros(channel_count, dtype='<u4')
+        for offset in range(0, channel_count, chunk_size):
+            count = min(chunk_size, channel_count - offset)
+            self.serialize_uint8(offset)
+            self.serialize_uint8(count)
+            self.send_command(CMD_GET_ON_TIME)
+            data = self._data_bytes()
+            if len(data) < 4 * count:
+                raise IOError(f"On time read returned {len(data)} bytes, "
+                              f"expected {4 * count} — firmware at "
+                              f"{self.address} may not support "
+                              f"`CMD_GET_ON_TIME`")
+            on_time[offset:offset + count] = np.frombuffer(data[:4 * count],
+                                                           dtype='<u4')
+        return on_time
+
+    def reset_on_time(self) -> None:
+        """
+        Reset accumulated on time of all channels.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_RESET_ON_TIME)
+
+    def set_groups(self, mask: int) -> None:
+        """
+        Set multicast group membership of the board (stored in EEPROM).
+
+        Parameters
+        ----------
+        mask : int
+            Bit mask of groups (0-7) the board is a member of.
+
+        See also
+        --------
+        group_set_state, group_clear
+
+        .. versionadded:: 4.2
+        """
+        _check_group_mask(mask)
+        self.serialize_uint8(mask)
+        self.send_command(CMD_SET_GROUPS)
+
+    def groups(self) -> int:
+        """
+        Read multicast group membership mask of the board.
+
+        .. versionadded:: 4.2
+        """
+        self.send_command(CMD_GET_GROUPS)
+        if not self.data:
+            raise IOError(f"Firmware at {self.address} may not support "
+                          f"`CMD_GET_GROUPS`")
+        return self.read_uint8()
 
     def state_of_all_channels(self) -> np.array:
+        """
+        Read state of all channels.
+
+        .. versionchanged:: 4.2
+            Fall back to reading PCA9505 output port registers one at a time
+            on firmware without `CAP_STATE_OF_ALL_CHANNELS`.  Write deferred
+            state (see `flush()`) first.
+        """
+        self.flush()
+        if not self.supports(CAP_STATE_OF_ALL_CHANNELS):
+            data = []
+            for port in range(self.shift_register_count):
+                # Select register and read it back as one locked step.
+                with self._bus_lock:
+                    self.proxy.i2c_write(self.address,
+                                         [PCA9505_OUTPUT_PORT_REGISTER +
+                                          port])
+                    data += self.proxy.i2c_read(self.address, 1).tolist()
+            return _decode_state(data, self.shift_register_count)
         self.data = []
         self.send_command(CMD_GET_STATE_OF_ALL_CHANNELS)
-        total_channels = self.shift_register_count * 8
-        state = np.zeros(total_channels, dtype=np.uint8)
-        for i in range(len(state)):
-            state[i] = self.data[i // 8] & (0x01 << (i % 8)) == 0
-        return state
+        return _decode_state(self.data, self.shift_register_count)
@@ -0,0 +1,130 @@
+# coding: utf-8
+"""
+Track the state of a fleet of switching boards, and write only what changed.
+
+`FleetState` keeps a ``(board_count, max_ports)`` shadow copy of the port
+bytes last written to each board.  A new fleet frame (e.g., from
+`RoutingIndex.pack`) is diffed against the shadow in one vectorized pass;
+unchanged boards are skipped, and changed ports of each remaining board are
+written as a few contiguous PCA9505 auto-increment ranges::
+
+    fleet = FleetState([board.shift_register_count for board in boards])
+    fleet.update(boards, index.pack(state))
+
+.. versionadded:: 4.2
+"""
+import numpy as np
+
+from typing import List, Sequence, Tuple
+
+from .driver import HVSwitchingBoard
+
+#: Write as ``(board, start port, active HIGH port bytes)``.
+PortWrite = Tuple[int, int, np.array]
+
+
+class FleetState:
+    def __init__(self, shift_register_counts: Sequence[int],
+                 merge_gap: int = 2):
+        """
+        Parameters
+        ----------
+        shift_register_counts : list
+            Number of shift registers (i.e., ports) of each board.
+        merge_gap : int, optional
+            Merge write ranges separated by at most this many unchanged
+            ports, since rewriting a few ports costs less bus time than an
+            extra I2C transaction (default: 2).
+        """
+        self.shift_register_counts = np.asarray(shift_register_counts,
+                                                dtype=int)
+        self.board_count = len(self.shift_register_counts)
+        self.max_ports = int(self.shift_register_counts.max(initial=0))
+        self.merge_gap = merge_gap
+        #: Port bytes last written to each board (**active HIGH**).
+        self.shadow = np.zeros((self.board_count, self.max_ports),
+                               dtype=np.uint8)
+        #: ``True`` for boards whose state is known (i.e., matches shadow).
+        self.known = np.zeros(self.board_count, dtype=bool)
+        # `True` for ports that exist on each board.
+        self._port_mask = (np.arange(self.max_ports)[None, :] <
+                           self.shift_register_counts[:, None])
+
+    def invalidate(self, board: int = None) -> None:
+        """
+        Mark state of ``board`` (default: all boards) as unknown, so all its
+        ports are written by the next update (e.g., after a reboot).
+        """
+        if board is None:
+            self.known[:] = False
+        else:
+            self.known[board] = False
+
+    def diff(self, frames: np.array) -> np.array:
+        """
+        Return ``(board_count, max_ports)`` mask of ports that differ from the
+        shadow (all ports of boards with unknown state).
+        """
+        frames = np.asarray(frames, dtype=np.uint8)
+        if frames.shape != self.shadow.shape:
+            raise ValueError(f"Expected frames of shape {self.shadow.shape}, "
+                             f"got {frames.shape}")
+        return ((frames != self.shadow) | ~self.known[:, None]) & \
+            self._port_mask
+
+    def plan(self, frames: np.array) -> List[PortWrite]:
+        """
+        Plan minimal port writes to bring the fleet from the shadow state to
+        ``frames``.
+
+        Returns
+        -------
+        list
+            ``(board, start, ports)`` writes, with contiguous ``ports`` bytes.
+        """
+        frames = np.asarray(frames, dtype=np.uint8)
+        changed = self.diff(frames)
+        writes = []
+        for board in np.flatnonzero(changed.any(axis=1)):
+            ports = np.flatnonzero(changed[board])
+            # Split into ranges where the gap to the next changed port is
+            # larger than `merge_gap`.
+            breaks = np.flatnonzero(np.diff(ports) > self.merge_gap + 1) + 1
+            for run in np.split(ports, breaks):
+                start, end = int(run[0]), int(run[-1]) + 1
+                writes.append((int(board), start, frames[board, start:end]))
+        return writes
+
+    def commit(self, writes: Sequence[PortWrite]) -> None:
+        """
+        Record completed writes in the shadow.
+        """
+        for board, start, ports in writes:
+            self.shadow[board, start:start + len(ports)] = ports
+            if start == 0 and len(ports) >= self.shift_register_counts[board]:
+                # State of board is known once it is written in full.
+                self.known[board] = True
+
+    def update(self, boards: Sequence[HVSwitchingBoard],
+               frames: np.array) -> List[PortWrite]:
+        """
+        Write changed ports of ``frames`` to ``boards`` and update shadow.
+
+        If a write fails, the state of that board is marked unknown before
+        the error is raised.
+
+        Returns
+        -------
+        list
+            Writes issued (see `plan()`).
+        """
+        writes = self.plan(frames)
+        for write in writes:
+            board, start, ports = write
+            try:
+                boards[board].write_ports(ports, start)
+            except Exception:
+                self.invalidate(board)
+                raise
+            self.commit([write])
+        return writes
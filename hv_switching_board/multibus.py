@@ -0,0 +1,155 @@
+# coding: utf-8
+"""
+Issue switching board writes on several I2C buses in parallel.
+
+Boards behind the same proxy share a bus, and each bus gets its own worker
+thread, so the time for a fleet update is that of the slowest bus rather
+than the sum of all buses::
+
+    with MultiBusDispatcher(boards) as dispatcher:
+        timing = dispatcher.update(fleet, index.pack(state))
+
+Board indices match the board axis of `FleetState` and `RoutingIndex`.
+
+.. versionadded:: 4.2
+"""
+import time
+import logging
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+from .driver import HVSwitchingBoard
+from .fleet import FleetState, PortWrite
+
+logger = logging.getLogger(__name__)
+
+
+class MultiBusDispatcher:
+    def __init__(self, boards: Sequence[HVSwitchingBoard]):
+        """
+        Parameters
+        ----------
+        boards : list
+            Boards of the fleet.  Boards with the same proxy are on the same
+            bus.
+        """
+        self.boards = list(boards)
+        #: Proxy of each bus.
+        self.proxies = []
+        bus_of_board = []
+        for board in self.boards:
+            for bus, proxy in enumerate(self.proxies):
+                if proxy is board.proxy:
+                    break
+            else:
+                bus = len(self.proxies)
+                self.proxies.append(board.proxy)
+            bus_of_board.append(bus)
+        #: Bus of each board.
+        self.bus_of_board = np.array(bus_of_board, dtype=int)
+        # A single worker per bus keeps transactions on each proxy ordered.
+        self._executors = [ThreadPoolExecutor(max_workers=1,
+                                              thread_name_prefix=f'hv-bus-{i}')
+                           for i in range(len(self.proxies))]
+        #: Timing of last update (see `write()`).
+        self.last_timing = {}
+
+    def close(self) -> None:
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_bus(self, writes: List[PortWrite]):
+        start = time.perf_counter()
+        completed = []
+        error = None
+        for write in writes:
+            board, first_port, ports = write
+            try:
+                self.boards[board].write_ports(ports, first_port)
+            except Exception as exception:
+                error = (board, exception)
+                break
+            completed.append(write)
+        return completed, time.perf_counter() - start, error
+
+    def _dispatch(self, writes: Sequence[PortWrite]):
+        by_bus = {}
+        for write in writes:
+            by_bus.setdefault(int(self.bus_of_board[write[0]]),
+                              []).append(write)
+        futures = {bus: self._executors[bus].submit(self._write_bus,
+                                                    bus_writes)
+                   for bus, bus_writes in by_bus.items()}
+        # Wait for **every** bus, even if one fails.
+        return {bus: future.result() for bus, future in futures.items()}
+
+    @staticmethod
+    def _timing(results) -> Dict[int, Dict]:
+        return {bus: {'writes': len(completed), 'elapsed': elapsed}
+                for bus, (completed, elapsed, error) in results.items()}
+
+    def write(self, writes: Sequence[PortWrite]) -> Dict[int, Dict]:
+        """
+        Issue port writes, in parallel across buses, and wait for all buses
+        to finish.
+
+        Parameters
+        ----------
+        writes : list
+            ``(board, start, ports)`` writes (see `FleetState.plan`).
+
+        Returns
+        -------
+        dict
+            ``writes`` (completed) and ``elapsed`` (seconds) of each bus with
+            writes.
+
+        Raises
+        ------
+        Exception
+            First error raised on any bus, after all buses have finished.
+        """
+        results = self._dispatch(writes)
+        self.last_timing = self._timing(results)
+        self._raise_first_error(results)
+        return self.last_timing
+
+    def update(self, fleet: FleetState, frames: np.array) -> Dict[int, Dict]:
+        """
+        Write changed ports of fleet ``frames`` (see `FleetState.plan`), in
+        parallel across buses, and update the ``fleet`` shadow.
+
+        Boards with a failed write are marked unknown in ``fleet`` (i.e.,
+        rewritten in full by the next update).
+
+        Returns
+        -------
+        dict
+            Timing of each bus (see `write()`).
+        """
+        results = self._dispatch(fleet.plan(frames))
+        for completed, elapsed, error in results.values():
+            fleet.commit(completed)
+            if error is not None:
+                fleet.invalidate(error[0])
+        self.last_timing = self._timing(results)
+        self._raise_first_error(results)
+        return self.last_timing
+
+    def _raise_first_error(self, results) -> None:
+        errors = [(bus, error) for bus, (_, _, error) in
+                  sorted(results.items()) if error is not None]
+        for bus, (board, exception) in errors[1:]:
+            logger.error(f'Write to board {self.boards[board].address} on bus '
+                         f'{bus} failed: {exception}')
+        if errors:
+            raise errors[0][1][1]
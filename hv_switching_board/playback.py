@@ -0,0 +1,133 @@
+# coding: utf-8
+"""
+Play back actuation protocols with absolute deadlines.
+
+Each frame is due at a fixed offset from the start of playback (rather than
+a fixed delay after the previous frame), so timing errors do not accumulate.
+While waiting for a deadline, the next frame is encoded and its writes are
+planned, so only the bus transfers remain when the deadline arrives::
+
+    report = play(boards, states, timestamps, index=index)
+    for board in report['boards']:
+        print(board['address'], board['lateness_max'], board['jitter'])
+
+.. versionadded:: 4.2
+"""
+import time
+
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+import numpy as np
+
+from .driver import HVSwitchingBoard
+from .fleet import FleetState
+from .routing import RoutingIndex
+
+
+def wait_until(deadline: float, clock: Callable[[], float] = time.perf_counter,
+               spin: float = 0.001) -> None:
+    """
+    Wait until ``clock()`` reaches ``deadline``: sleep until ``spin`` seconds
+    before, then busy-wait (sleep alone overshoots by up to the OS timer
+    resolution).
+    """
+    remaining = deadline - clock()
+    if remaining > spin:
+        time.sleep(remaining - spin)
+    while clock() < deadline:
+        pass
+
+
+def play(boards: Sequence[HVSwitchingBoard], frames: Iterable,
+         timestamps: Iterable[float], index: Optional[RoutingIndex] = None,
+         fleet: Optional[FleetState] = None,
+         max_lateness: Optional[float] = None, start_delay: float = 0.01,
+         spin: float = 0.001,
+         clock: Callable[[], float] = time.perf_counter) -> Dict:
+    """
+    Write each frame when it is due.
+
+    Parameters
+    ----------
+    boards : list
+        Boards, in fleet frame board order.
+    frames : iterable
+        Global channel states (if ``index`` is set) or fleet frames of shape
+        ``(board_count, max_ports)`` (see `RoutingIndex.pack`).
+    timestamps : iterable
+        Due time of each frame, in seconds from start of playback.
+    index : RoutingIndex, optional
+        Routing of global channel states to fleet frames.
+    fleet : FleetState, optional
+        Fleet shadow (default: new shadow, i.e., first frame written in full).
+    max_lateness : float, optional
+        Skip frames that are more than this many seconds late before being
+        written (default: never skip).
+    start_delay : float, optional
+        Seconds from call until first timestamp (time to encode the first
+        frame).
+    spin : float, optional
+        Busy-wait this many seconds before each deadline (see
+        `wait_until()`).
+    clock : callable, optional
+        High resolution clock (default: `time.perf_counter`).
+
+    Returns
+    -------
+    dict
+        ``frames`` (played), ``skipped`` (frame count), ``duration``
+        (seconds), and ``boards``: for each board, ``address``, ``writes``
+        (frames with writes), ``skipped`` (skipped frames that changed the
+        board), and lateness of writes relative to the deadline
+        (``lateness_mean``, ``lateness_max``) and its standard deviation
+        (``jitter``), in seconds.
+    """
+    fleet = fleet or FleetState([board.shift_register_count
+                                 for board in boards])
+    lateness = [[] for _ in boards]
+    skipped = np.zeros(len(boards), dtype=int)
+    frame_count = skipped_count = 0
+    start = clock() + start_delay
+
+    for frame, timestamp in zip(frames, timestamps):
+        # Encode and plan ahead of the deadline.
+        if index is not None:
+            frame = index.pack(frame)
+        writes = fleet.plan(frame)
+        deadline = start + timestamp
+
+        if max_lateness is not None and clock() - deadline > max_lateness:
+            for board in {write[0] for write in writes}:
+                skipped[board] += 1
+            skipped_count += 1
+            continue
+        wait_until(deadline, clock, spin)
+
+        written = set()
+        for write in writes:
+            board, first_port, ports = write
+            if board not in written:
+                lateness[board].append(clock() - deadline)
+                written.add(board)
+            try:
+                boards[board].write_ports(ports, first_port)
+            except Exception:
+                fleet.invalidate(board)
+                raise
+            fleet.commit([write])
+        frame_count += 1
+
+    report_boards = []
+    for board, board_lateness, board_skipped in zip(boards, lateness,
+                                                    skipped):
+        board_lateness = np.array(board_lateness)
+        has_writes = len(board_lateness) > 0
+        report_boards.append({
+            'address': board.address,
+            'writes': len(board_lateness),
+            'skipped': int(board_skipped),
+            'lateness_mean': float(board_lateness.mean()) if has_writes else 0.,
+            'lateness_max': float(board_lateness.max()) if has_writes else 0.,
+            'jitter': float(board_lateness.std()) if has_writes else 0.})
+    return {'frames': frame_count, 'skipped': skipped_count,
+            'duration': clock() - start, 'boards': report_boards}
@@ -0,0 +1,249 @@
+# coding: utf-8
+"""
+Compact binary actuation protocol files, memory-mapped for reading, so long
+protocols (e.g., millions of frames) are streamed from disk rather than
+loaded into memory::
+
+    with ProtocolWriter('protocol.hvp', addresses, shift_register_counts,
+                        frame_rate=100) as writer:
+        writer.append(index.pack(states), dwell)
+
+    protocol = ProtocolFile('protocol.hvp')
+    play(boards, protocol.ports, protocol.timestamps())
+
+Layout (little-endian):
+
+ - header (`PROTOCOL_HEADER`): ``(magic, version, board_count, max_ports,
+   frame_rate, frame_count)``, padded to 32 bytes;
+ - board map: ``(address, shift_register_count)`` byte pair per board,
+   padded to a multiple of 8 bytes;
+ - frame records (`frame_dtype()`): ``dwell`` (``uint32``; number of ticks
+   at ``frame_rate``, i.e., frame duration is ``dwell / frame_rate``
+   seconds) followed by ``(board_count, max_ports)`` **active HIGH** port
+   bytes (see `RoutingIndex.pack`).
+
+.. versionadded:: 4.2
+"""
+import os
+import struct
+
+from typing import Iterator, Optional, Sequence, Union
+
+import numpy as np
+
+#: File header ``(magic, version, board_count, max_ports, reserved,
+#: frame_rate, frame_count)``.
+PROTOCOL_HEADER = struct.Struct('<4sHHHHdQ')
+PROTOCOL_MAGIC = b'HVPF'
+PROTOCOL_VERSION = 1
+_HEADER_SIZE = 32
+
+
+def _align(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def frame_dtype(board_count: int, max_ports: int) -> np.dtype:
+    """
+    Return record type of protocol frames.
+    """
+    return np.dtype([('dwell', '<u4'),
+                     ('ports', np.uint8, (board_count, max_ports))])
+
+
+def _frames_offset(board_count: int) -> int:
+    return _HEADER_SIZE + _align(2 * board_count)
+
+
+class ProtocolWriter:
+    def __init__(self, filename: str, addresses: Sequence[int],
+                 shift_register_counts: Sequence[int],
+                 frame_rate: float = 1000.):
+        """
+        Write protocol file, one frame or chunk of frames at a time.
+
+        Parameters
+        ----------
+        filename : str
+            Output file path (overwritten).
+        addresses : list
+            I2C address of each board.
+        shift_register_counts : list
+            Number of shift registers (i.e., ports) of each board.
+        frame_rate : float, optional
+            Dwell ticks per second (default: 1000, i.e., dwell in ms).
+        """
+        if len(addresses) != len(shift_register_counts):
+            raise ValueError('Expected an address per shift register count.')
+        if frame_rate <= 0:
+            raise ValueError('Frame rate must be positive.')
+        self.filename = filename
+        self.addresses = np.asarray(addresses, dtype=np.uint8)
+        self.shift_register_counts = np.asarray(shift_register_counts,
+                                                dtype=np.uint8)
+        self.board_count = len(self.addresses)
+        self.max_ports = int(self.shift_register_counts.max(initial=0))
+        self.frame_rate = float(frame_rate)
+        self.frame_count = 0
+        self.dtype = frame_dtype(self.board_count, self.max_ports)
+        self._output = open(filename, 'wb')
+        self._write_header()
+        board_map = np.column_stack([self.addresses,
+                                     self.shift_register_counts]).tobytes()
+        self._output.write(board_map.ljust(_align(len(board_map)), b'\0'))
+
+    def _write_header(self) -> None:
+        self._output.seek(0)
+        self._output.write(PROTOCOL_HEADER.pack(
+            PROTOCOL_MAGIC, PROTOCOL_VERSION, self.board_count,
+            self.max_ports, 0, self.frame_rate, self.frame_count)
+            .ljust(_HEADER_SIZE, b'\0'))
+
+    def append(self, frames: np.array,
+               dwell: Union[int, Sequence[int], np.array] = 1) -> None:
+        """
+        Append frames.
+
+        Parameters
+        ----------
+        frames : numpy.array
+            **Active HIGH** port bytes of shape ``(board_count, max_ports)``,
+            or ``(frame_count, board_count, max_ports)`` for several frames.
+        dwell : int or list, optional
+            Duration of each frame, in ticks of ``frame_rate`` (default: 1).
+        """
+        frames = np.asarray(frames, dtype=np.uint8)
+        shape = (self.board_count, self.max_ports)
+        if frames.shape == shape:
+            frames = frames[None]
+        elif frames.shape[1:] != shape:
+            raise ValueError(f"Expected frames of shape {shape}, got "
+                             f"{frames.shape[1:]}")
+        records = np.empty(len(frames), dtype=self.dtype)
+        records['dwell'] = dwell
+        records['ports'] = frames
+        self._output.write(records.tobytes())
+        self.frame_count += len(records)
+
+    def flush(self) -> None:
+        """
+        Update frame count in header and flush file (i.e., frames appended so
+        far are visible to readers).
+        """
+        position = self._output.tell()
+        self._write_header()
+        self._output.seek(position)
+        self._output.flush()
+
+    def close(self) -> None:
+        if not self._output.closed:
+            self.flush()
+            self._output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ProtocolFile:
+    def __init__(self, filename: str, mode: str = 'r'):
+        """
+        Memory-map protocol file.
+
+        Parameters
+        ----------
+        filename : str
+            Protocol file path.
+        mode : str, optional
+            `numpy.memmap` mode (default: ``'r'``, i.e., read only; use
+            ``'r+'`` to edit frames in place).
+        """
+        self.filename = filename
+        with open(filename, 'rb') as input_:
+            header = input_.read(_HEADER_SIZE)
+            if len(header) < _HEADER_SIZE:
+                raise ValueError(f"`{filename}` is not a protocol file")
+            magic, version, board_count, max_ports, _, frame_rate, \
+                frame_count = PROTOCOL_HEADER.unpack_from(header)
+            if magic != PROTOCOL_MAGIC:
+                raise ValueError(f"`{filename}` is not a protocol file")
+            elif version != PROTOCOL_VERSION:
+                raise ValueError(f"Unsupported protocol file version "
+                                 f"{version} (expected {PROTOCOL_VERSION})")
+            board_map = np.frombuffer(input_.read(2 * board_count),
+                                      dtype=np.uint8).reshape(-1, 2)
+        self.board_count = board_count
+        self.max_ports = max_ports
+        self.frame_rate = frame_rate
+        self.addresses = board_map[:, 0].astype(int)
+        self.shift_register_counts = board_map[:, 1].astype(int)
+        self.dtype = frame_dtype(board_count, max_ports)
+
+        offset = _frames_offset(board_count)
+        # Ignore frames appended after the last header update (e.g., file of
+        # an interrupted writer).
+        available = (os.path.getsize(filename) - offset) // \
+            self.dtype.itemsize
+        self.frame_count = min(frame_count, available)
+        if self.frame_count:
+            #: Frame records (see `frame_dtype()`).
+            self.frames = np.memmap(filename, dtype=self.dtype, mode=mode,
+                                    offset=offset, shape=(self.frame_count, ))
+        else:
+            self.frames = np.empty(0, dtype=self.dtype)
+
+    def __len__(self) -> int:
+        return self.frame_count
+
+    @property
+    def ports(self) -> np.array:
+        """
+        Memory-mapped ``(frame_count, board_count, max_ports)`` port bytes.
+        """
+        return self.frames['ports']
+
+    @property
+    def dwell(self) -> np.array:
+        """
+        Memory-mapped dwell ticks of each frame.
+        """
+        return self.frames['dwell']
+
+    @property
+    def duration(self) -> float:
+        """
+        Total protocol duration, in seconds.
+        """
+        return float(self.dwell.sum(dtype=np.uint64)) / self.frame_rate
+
+    def timestamps(self) -> np.array:
+        """
+        Return start time of each frame, in seconds from protocol start.
+        """
+        ticks = np.cumsum(self.dwell, dtype=np.uint64)
+        return np.concatenate([[0], ticks[:-1]]) / self.frame_rate \
+            if len(ticks) else np.zeros(0)
+
+    def chunks(self, chunk_size: int = 4096,
+               start: int = 0, stop: Optional[int] = None) -> \
+            Iterator[np.array]:
+        """
+        Iterate over consecutive chunks of frame records (memory-mapped views,
+        so only pages touched are read from disk).
+        """
+        stop = self.frame_count if stop is None else min(stop,
+                                                         self.frame_count)
+        for i in range(start, stop, chunk_size):
+            yield self.frames[i:min(i + chunk_size, stop)]
+
+    def close(self) -> None:
+        # Mapping is closed once no views of it remain.
+        self.frames = np.empty(0, dtype=self.dtype)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
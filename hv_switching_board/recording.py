@@ -0,0 +1,395 @@
+# coding: utf-8
+"""
+Record and replay the I2C transactions issued by `HVSwitchingBoard`, e.g.,
+to turn a field trace into a repeatable benchmark.
+
+`RecordingProxy` wraps a proxy and logs every ``i2c_write``, ``i2c_read``,
+``i2c_send_command`` and ``i2c_scan`` call (with its time, duration, payload
+and response) to a compact binary log; `replay()` re-issues a log against a
+real proxy or a `SimulatedProxy`, at the original timing (optionally scaled)
+or as fast as possible::
+
+    with RecordingProxy(proxy, 'trace.hvr') as recorder:
+        board = HVSwitchingBoard(recorder, 32)
+        ...
+
+    report = replay('trace.hvr', SimulatedProxy.from_log('trace.hvr'),
+                    speed=None)
+
+Log layout (little-endian): header (`LOG_HEADER`) ``(magic, version,
+start time)``, then one record header (`RECORD_HEADER`) ``(time, duration,
+opcode, address, argument, request length, response length)`` per
+transaction (``time`` in seconds from start of recording), followed by its
+request and response bytes.
+
+.. versionadded:: 4.2
+"""
+import time
+import struct
+import threading
+
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from .driver import (CAP_SHIFT_REGISTER_COUNT, CAP_STATE_OF_ALL_CHANNELS,
+                     CMD_GET_CAPABILITIES, CMD_GET_SHIFT_REGISTER_COUNT,
+                     CMD_GET_STATE_OF_ALL_CHANNELS,
+                     PCA9505_AUTO_INCREMENT, PCA9505_OUTPUT_PORT_REGISTER)
+from .playback import wait_until
+
+#: Log header ``(magic, version, start time)`` (start time as
+#: `time.time()`).
+LOG_HEADER = struct.Struct('<4sHd')
+LOG_MAGIC = b'HVRL'
+LOG_VERSION = 1
+#: Record header ``(time, duration, opcode, address, argument, request
+#: length, response length)``.
+RECORD_HEADER = struct.Struct('<dfBBHHH')
+
+OP_I2C_WRITE = 0x01
+OP_I2C_READ = 0x02
+OP_I2C_SEND_COMMAND = 0x03
+OP_I2C_SCAN = 0x04
+#: Opcode flag of transactions that raised an exception.
+OP_FAILED = 0x80
+
+#: Logged transaction (``argument`` is the byte count of reads, or the
+#: command of ``i2c_send_command``).
+Transaction = namedtuple('Transaction', 'time duration opcode address '
+                         'argument request response failed')
+
+# Base node commands emulated by `SimulatedProxy`.
+_CMD_GET_NAME = 0x82
+_CMD_GET_SOFTWARE_VERSION = 0x85
+# Output port registers of PCA9505 (next register bank is polarity inversion).
+_PCA9505_OUTPUT_PORT_REGISTERS = 8
+
+
+def _bytes(data) -> bytes:
+    return np.asarray(data, dtype=np.uint8).tobytes()
+
+
+class RecordingProxy:
+    def __init__(self, proxy, filename: str):
+        """
+        Parameters
+        ----------
+        proxy
+            Proxy to wrap (e.g., `dropbot.SerialProxy`); all other attributes
+            are forwarded.
+        filename : str
+            Log file path (overwritten).
+        """
+        self.proxy = proxy
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._output = open(filename, 'wb')
+        self._output.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION,
+                                           time.time()))
+        self._start = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self.proxy, name)
+
+    def _call(self, opcode: int, address: int, argument: int,
+              request: bytes, function, *args):
+        start = time.perf_counter()
+        try:
+            result = function(*args)
+        except Exception:
+            self._log(start, opcode | OP_FAILED, address, argument, request,
+                      b'')
+            raise
+        self._log(start, opcode, address, argument, request,
+                  b'' if result is None else _bytes(result))
+        return result
+
+    def _log(self, start: float, opcode: int, address: int, argument: int,
+             request: bytes, response: bytes) -> None:
+        end = time.perf_counter()
+        with self._lock:
+            self._output.write(RECORD_HEADER.pack(
+                start - self._start, end - start, opcode, address, argument,
+                len(request), len(response)) + request + response)
+
+    def i2c_write(self, address: int, data):
+        return self._call(OP_I2C_WRITE, address, 0, _bytes(data),
+                          self.proxy.i2c_write, address, data)
+
+    def i2c_read(self, address: int, count: int):
+        return self._call(OP_I2C_READ, address, count, b'',
+                          self.proxy.i2c_read, address, count)
+
+    def i2c_send_command(self, address: int, cmd: int, data, *args,
+                         **kwargs):
+        return self._call(OP_I2C_SEND_COMMAND, address, cmd, _bytes(data),
+                          self.proxy.i2c_send_command, address, cmd, data,
+                          *args, **kwargs)
+
+    def i2c_scan(self):
+        return self._call(OP_I2C_SCAN, 0, 0, b'', self.proxy.i2c_scan)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._output.flush()
+
+    def close(self) -> None:
+        """
+        Close log (the wrapped proxy is left open).
+        """
+        with self._lock:
+            self._output.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_log(filename: str) -> Iterator[Transaction]:
+    """
+    Iterate over transactions of log.
+    """
+    with open(filename, 'rb') as input_:
+        magic, version, _ = LOG_HEADER.unpack(input_.read(LOG_HEADER.size))
+        if magic != LOG_MAGIC:
+            raise ValueError(f"`{filename}` is not a transaction log")
+        elif version != LOG_VERSION:
+            raise ValueError(f"Unsupported transaction log version {version} "
+                             f"(expected {LOG_VERSION})")
+        while True:
+            header = input_.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                # End of log (or record truncated by an interrupted
+                # recording).
+                return
+            time_, duration, opcode, address, argument, request_length, \
+                response_length = RECORD_HEADER.unpack(header)
+            request = input_.read(request_length)
+            response = input_.read(response_length)
+            if len(response) < response_length:
+                return
+            yield Transaction(time_, duration, opcode & ~OP_FAILED, address,
+                              argument, request, response,
+                              bool(opcode & OP_FAILED))
+
+
+def replay(log: Union[str, List[Transaction]], proxy,
+           speed: Optional[float] = 1., spin: float = 0.001) -> Dict:
+    """
+    Re-issue logged transactions.
+
+    Parameters
+    ----------
+    log : str or list
+        Log file path, or transactions (see `read_log()`).
+    proxy
+        Proxy to issue transactions to (e.g., a `SimulatedProxy`).
+    speed : float, optional
+        Replay at ``speed`` times the original rate (default: 1, i.e.,
+        original timing), or as fast as possible if ``None``.
+    spin : float, optional
+        Busy-wait this many seconds before each transaction (see
+        `wait_until()`).
+
+    Returns
+    -------
+    dict
+        ``transactions`` (count), ``failed`` (transactions that raised an
+        exception), ``mismatches`` (responses differing from log),
+        ``duration`` and ``recorded_duration`` (seconds), and ``operations``:
+        ``count``, ``duration_mean`` and ``duration_max`` (seconds) of each
+        of ``i2c_write``, ``i2c_read``, ``i2c_send_command`` and
+        ``i2c_scan``, both as replayed and as recorded (``recorded_*``).
+    """
+    transactions = read_log(log) if isinstance(log, str) else log
+    names = {OP_I2C_WRITE: 'i2c_write', OP_I2C_READ: 'i2c_read',
+             OP_I2C_SEND_COMMAND: 'i2c_send_command',
+             OP_I2C_SCAN: 'i2c_scan'}
+    durations = {opcode: [] for opcode in names}
+    recorded_durations = {opcode: [] for opcode in names}
+    count = failed = mismatches = 0
+    recorded_end = 0.
+    start = time.perf_counter()
+
+    for transaction in transactions:
+        if speed is not None:
+            wait_until(start + transaction.time / speed, spin=spin)
+        opcode, address = transaction.opcode, transaction.address
+        if opcode not in names:
+            raise ValueError(f"Unknown opcode 0x{opcode:02x}")
+        request = list(transaction.request)
+        start_i = time.perf_counter()
+        try:
+            if opcode == OP_I2C_WRITE:
+                response = proxy.i2c_write(address, request)
+            elif opcode == OP_I2C_READ:
+                response = proxy.i2c_read(address, transaction.argument)
+            elif opcode == OP_I2C_SEND_COMMAND:
+                response = proxy.i2c_send_command(address,
+                                                  transaction.argument,
+                                                  request)
+            else:
+                response = proxy.i2c_scan()
+        except Exception:
+            response = None
+            failed += 1
+        durations[opcode].append(time.perf_counter() - start_i)
+        recorded_durations[opcode].append(transaction.duration)
+        response = b'' if response is None else _bytes(response)
+        if response != transaction.response:
+            mismatches += 1
+        count += 1
+        recorded_end = transaction.time + transaction.duration
+
+    def _stats(values: List[float], prefix: str = '') -> Dict:
+        return {f'{prefix}duration_mean':
+                float(np.mean(values)) if values else 0.,
+                f'{prefix}duration_max':
+                float(np.max(values)) if values else 0.}
+
+    return {'transactions': count, 'failed': failed,
+            'mismatches': mismatches,
+            'duration': time.perf_counter() - start,
+            'recorded_duration': recorded_end,
+            'operations': {name: dict(count=len(durations[opcode]),
+                                      **_stats(durations[opcode]),
+                                      **_stats(recorded_durations[opcode],
+                                               'recorded_'))
+                           for opcode, name in names.items()}}
+
+
+class SimulatedProxy:
+    def __init__(self, boards: Dict[int, int], latency: float = 0.,
+                 software_version: str = '4.2.0'):
+        """
+        Emulate the I2C side of switching board firmware, without hardware
+        (e.g., for tests, or to replay logs).
+
+        Emulates PCA9505 output port register writes (including
+        auto-increment) and reads, and the commands needed to detect
+        capabilities and shift register count and to read the state of all
+        channels.  Other commands raise `IOError`.
+
+        Parameters
+        ----------
+        boards : dict
+            Shift register count of each board, by I2C address.
+        latency : float, optional
+            Seconds to busy-wait per transaction (e.g., to emulate bus
+            time).
+        software_version : str, optional
+            Reported firmware version.
+        """
+        #: **Active HIGH** port bytes of each board, by I2C address.
+        self.ports = {address: np.zeros(count, dtype=np.uint8)
+                      for address, count in boards.items()}
+        self.latency = latency
+        self.software_version = software_version
+        #: Number of transactions issued.
+        self.transactions = 0
+        self._register = {address: PCA9505_OUTPUT_PORT_REGISTER
+                          for address in boards}
+
+    @classmethod
+    def from_log(cls, log: Union[str, List[Transaction]],
+                 **kwargs) -> 'SimulatedProxy':
+        """
+        Create proxy emulating the boards of a log.
+
+        The shift register count of each board is taken from its logged
+        capabilities or shift register count response, if any, or else
+        inferred from the highest output port register written (other
+        writes, e.g., board commands, are ignored).  Defaults to 5.
+        """
+        transactions = read_log(log) if isinstance(log, str) else log
+        addresses = set()
+        reported, inferred = {}, {}
+        for transaction in transactions:
+            if transaction.failed:
+                continue
+            address, response = transaction.address, transaction.response
+            if transaction.opcode == OP_I2C_SCAN:
+                addresses.update(response)
+                continue
+            addresses.add(address)
+            if transaction.opcode == OP_I2C_SEND_COMMAND and \
+                    transaction.argument == CMD_GET_CAPABILITIES and \
+                    len(response) >= 5:
+                reported[address] = response[4]
+            elif transaction.opcode == OP_I2C_SEND_COMMAND and \
+                    transaction.argument == CMD_GET_SHIFT_REGISTER_COUNT and \
+                    response:
+                reported[address] = response[0]
+            elif transaction.opcode == OP_I2C_WRITE and transaction.request:
+                request = transaction.request
+                port = (request[0] & ~PCA9505_AUTO_INCREMENT) - \
+                    PCA9505_OUTPUT_PORT_REGISTER
+                if not 0 <= port < _PCA9505_OUTPUT_PORT_REGISTERS:
+                    continue
+                if request[0] & PCA9505_AUTO_INCREMENT:
+                    last = port + max(len(request) - 1, 1)
+                else:
+                    # Without auto-increment, all bytes go to the same port.
+                    last = port + 1
+                inferred[address] = max(inferred.get(address, 0),
+                                        min(last,
+                                            _PCA9505_OUTPUT_PORT_REGISTERS))
+        return cls({address: reported.get(address) or inferred.get(address)
+                    or 5 for address in addresses}, **kwargs)
+
+    def _transaction(self, address: int) -> np.array:
+        self.transactions += 1
+        if self.latency:
+            wait_until(time.perf_counter() + self.latency)
+        if address not in self.ports:
+            raise IOError(f"No board at address {address}")
+        return self.ports[address]
+
+    def i2c_scan(self) -> np.array:
+        self.transactions += 1
+        return np.array(sorted(self.ports), dtype=np.uint8)
+
+    def i2c_write(self, address: int, data) -> None:
+        ports = self._transaction(address)
+        data = np.asarray(data, dtype=np.uint8)
+        if not len(data):
+            return
+        register = int(data[0]) & ~PCA9505_AUTO_INCREMENT
+        self._register[address] = register
+        port = register - PCA9505_OUTPUT_PORT_REGISTER
+        values = data[1:]
+        if len(values) > 1 and not data[0] & PCA9505_AUTO_INCREMENT:
+            # Without auto-increment, each byte overwrites the same port.
+            values = values[-1:]
+        if len(values) and 0 <= port and port + len(values) <= len(ports):
+            ports[port:port + len(values)] = ~values
+
+    def i2c_read(self, address: int, count: int) -> np.array:
+        ports = self._transaction(address)
+        port = self._register[address] - PCA9505_OUTPUT_PORT_REGISTER
+        if not 0 <= port < len(ports):
+            return np.zeros(count, dtype=np.uint8)
+        return np.resize(~ports[port:port + 1], count)
+
+    def i2c_send_command(self, address: int, cmd: int, data,
+                         *args, **kwargs) -> np.array:
+        ports = self._transaction(address)
+        if cmd == CMD_GET_STATE_OF_ALL_CHANNELS:
+            response = (~ports).tobytes()
+        elif cmd == CMD_GET_SHIFT_REGISTER_COUNT:
+            response = bytes([len(ports)])
+        elif cmd == CMD_GET_CAPABILITIES:
+            response = struct.pack('<IB', CAP_STATE_OF_ALL_CHANNELS |
+                                   CAP_SHIFT_REGISTER_COUNT, len(ports))
+        elif cmd == _CMD_GET_SOFTWARE_VERSION:
+            response = self.software_version.encode()
+        elif cmd == _CMD_GET_NAME:
+            response = b'HV Switching Board (simulated)'
+        else:
+            raise IOError(f"Command 0x{cmd:02x} not supported by simulated "
+                          f"board")
+        return np.frombuffer(response, dtype=np.uint8).copy()
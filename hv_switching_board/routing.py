@@ -0,0 +1,149 @@
+# coding: utf-8
+"""
+Route global channel (e.g., electrode) states to switching board ports.
+
+A `RoutingIndex` maps each global channel to a ``(board, port, bit)``
+location, for arbitrary wiring, and converts a global state vector to packed
+per-board frames in a single vectorized pass::
+
+    index = RoutingIndex.contiguous([5, 5, 12])
+    frames = index.pack(state)  # shape: (3, 12)
+    for board, ports in zip(boards, index.split(frames)):
+        board.write_ports(ports)
+
+Frames are **active HIGH** port bytes (bit ``i`` of port ``p`` is board
+channel ``8 * p + i``), as accepted by `HVSwitchingBoard.write_ports`.
+
+.. versionadded:: 4.2
+"""
+import numpy as np
+
+from typing import List, Sequence, Union
+
+
+class RoutingIndex:
+    def __init__(self, shift_register_counts: Sequence[int],
+                 board: Sequence[int], port: Sequence[int],
+                 bit: Sequence[int]):
+        """
+        Parameters
+        ----------
+        shift_register_counts : list
+            Number of shift registers (i.e., ports) of each board.
+        board, port, bit : list or numpy.array
+            Location of each global channel.
+
+        Raises
+        ------
+        ValueError
+            If a location is out of range, or used by more than one global
+            channel.
+        """
+        self.shift_register_counts = np.asarray(shift_register_counts,
+                                                dtype=int)
+        self.board = np.asarray(board, dtype=np.intp)
+        self.port = np.asarray(port, dtype=np.intp)
+        self.bit = np.asarray(bit, dtype=np.intp)
+        if not (self.board.shape == self.port.shape == self.bit.shape) or \
+                self.board.ndim != 1:
+            raise ValueError('`board`, `port` and `bit` must be 1D arrays of '
+                             'equal length.')
+        self.board_count = len(self.shift_register_counts)
+        self.max_ports = int(self.shift_register_counts.max(initial=0))
+
+        if len(self.board) and ((self.board < 0).any() or
+                                (self.board >= self.board_count).any() or
+                                (self.port < 0).any() or
+                                (self.port >= self.shift_register_counts[
+                                    self.board.clip(0, self.board_count - 1)]
+                                 ).any() or
+                                (self.bit < 0).any() or (self.bit > 7).any()):
+            raise ValueError('Channel location out of range.')
+
+        # Precompute flat bit offset of each global channel in a
+        # `(board_count, max_ports * 8)` bit array.
+        self._offsets = ((self.board * self.max_ports + self.port) * 8 +
+                         self.bit)
+        if len(np.unique(self._offsets)) != len(self._offsets):
+            raise ValueError('Channel locations must be unique.')
+
+    @classmethod
+    def contiguous(cls, shift_register_counts: Sequence[int]) -> \
+            'RoutingIndex':
+        """
+        Create index where global channels are numbered board by board
+        (i.e., board ``0`` channels first).
+        """
+        counts = np.asarray(shift_register_counts, dtype=int)
+        board = np.repeat(np.arange(len(counts)), counts * 8)
+        local = np.concatenate([np.arange(n * 8) for n in counts]) \
+            if len(counts) else np.array([], dtype=int)
+        return cls(counts, board, local // 8, local % 8)
+
+    @classmethod
+    def from_mapping(cls, shift_register_counts: Sequence[int],
+                     mapping: Union[Sequence, np.array]) -> 'RoutingIndex':
+        """
+        Create index from a ``(board, port, bit)`` location per global
+        channel (e.g., from a wiring table).
+        """
+        mapping = np.asarray(mapping, dtype=np.intp).reshape(-1, 3)
+        return cls(shift_register_counts, mapping[:, 0], mapping[:, 1],
+                   mapping[:, 2])
+
+    @property
+    def channel_count(self) -> int:
+        """
+        Number of global channels.
+        """
+        return len(self._offsets)
+
+    def pack(self, state: Union[Sequence, np.array]) -> np.array:
+        """
+        Pack global channel states into per-board frames.
+
+        Parameters
+        ----------
+        state : list or numpy.array
+            State of each global channel, or array of shape ``(frame_count,
+            channel_count)`` of several states.
+
+        Returns
+        -------
+        numpy.array
+            ``uint8`` **active HIGH** port bytes of shape ``(board_count,
+            max_ports)`` (or ``(frame_count, board_count, max_ports)``).
+            Ports past the shift register count of a board are zero.
+        """
+        state = np.asarray(state)
+        if state.shape[-1] != self.channel_count:
+            raise ValueError(f"Expected {self.channel_count} channel states, "
+                             f"got {state.shape[-1]}")
+        leading = state.shape[:-1]
+        bits = np.zeros(leading + (self.board_count * self.max_ports * 8, ),
+                        dtype=np.uint8)
+        bits[..., self._offsets] = state != 0
+        bits = bits.reshape(leading + (self.board_count, self.max_ports * 8))
+        return np.packbits(bits, axis=-1, bitorder='little')
+
+    def unpack(self, frames: np.array) -> np.array:
+        """
+        Unpack per-board frames (see `pack()`) into global channel states.
+        """
+        frames = np.asarray(frames, dtype=np.uint8)
+        bits = np.unpackbits(frames, axis=-1, bitorder='little')
+        bits = bits.reshape(frames.shape[:-2] + (-1, ))
+        return bits[..., self._offsets]
+
+    def split(self, frames: np.array) -> List[np.array]:
+        """
+        Return port bytes of each board, trimmed to its shift register count.
+        """
+        return [frames[..., i, :n]
+                for i, n in enumerate(self.shift_register_counts)]
+
+    def channels(self, board: int) -> np.array:
+        """
+        Return global channels routed to ``board``.
+        """
+        return np.flatnonzero(self.board == board)
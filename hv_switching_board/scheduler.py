@@ -0,0 +1,237 @@
+# coding: utf-8
+"""
+Priority and deadline aware scheduling of switching board writes.
+
+Requests are served in order of priority (lower value first), then
+submission order.  All-off requests (`Scheduler.all_off`) always go to the
+head of the queue.  Frames are dropped (without touching the bus) if a newer
+request for the same board was submitted (i.e., superseded), or if they are
+past their deadline when they reach the head of the queue::
+
+    scheduler = Scheduler(boards)
+    scheduler.start()
+    scheduler.submit(0, state, deadline=time.perf_counter() + 0.01)
+    ...
+    scheduler.all_off()  # Skips ahead of queued frames.
+
+.. versionadded:: 4.2
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .driver import HVSwitchingBoard
+
+logger = logging.getLogger(__name__)
+
+#: Priority of all-off requests (served before anything else).
+PRIORITY_ALL_OFF = -1
+#: Default frame priority.
+PRIORITY_NORMAL = 10
+
+
+class _Request:
+    __slots__ = ('board', 'state', 'deadline', 'submitted', 'all_off')
+
+    def __init__(self, board, state, deadline, submitted, all_off=False):
+        self.board = board
+        self.state = state
+        self.deadline = deadline
+        self.submitted = submitted
+        self.all_off = all_off
+
+
+class Scheduler:
+    def __init__(self, boards: Sequence[HVSwitchingBoard],
+                 clock: Callable[[], float] = time.perf_counter):
+        """
+        Parameters
+        ----------
+        boards : list
+            Scheduled boards (requests refer to boards by index).
+        clock : callable, optional
+            Clock used for deadlines and latency (default:
+            `time.perf_counter`).
+        """
+        self.boards = list(boards)
+        self.clock = clock
+        self._queue = []
+        self._sequence = itertools.count()
+        # Sequence number of latest request of each board.
+        self._latest = {}
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        with self._condition:
+            #: Counters of each board: ``submitted``, ``written``,
+            #: ``superseded``, ``missed`` (past deadline), ``all_off``, and
+            #: queueing latency (``latency_total``, ``latency_max``; seconds).
+            self.stats = [{'submitted': 0, 'written': 0, 'superseded': 0,
+                           'missed': 0, 'all_off': 0, 'latency_total': 0.,
+                           'latency_max': 0.}
+                          for _ in self.boards]
+
+    def _push(self, priority: int, request: _Request) -> int:
+        with self._condition:
+            # Number under the lock, so `_latest` follows submission order.
+            sequence = next(self._sequence)
+            self._latest[request.board] = sequence
+            self.stats[request.board]['submitted'] += 1
+            heapq.heappush(self._queue, (priority, sequence, request))
+            self._condition.notify()
+        return sequence
+
+    def submit(self, board: int, state: Union[List, np.array],
+               priority: int = PRIORITY_NORMAL,
+               deadline: Optional[float] = None) -> int:
+        """
+        Queue state of all channels of ``board``.
+
+        Parameters
+        ----------
+        board : int
+            Board index.
+        state : list or numpy.array
+            State of each channel.
+        priority : int, optional
+            Lower values are served first (default: `PRIORITY_NORMAL`).
+        deadline : float, optional
+            Drop frame if not written by this `clock` time.
+
+        Returns
+        -------
+        int
+            Request sequence number.
+        """
+        if priority <= PRIORITY_ALL_OFF:
+            raise ValueError(f"Priority must be greater than "
+                             f"{PRIORITY_ALL_OFF} (reserved for all-off)")
+        return self._push(priority, _Request(board, np.array(state, copy=True),
+                                             deadline, self.clock()))
+
+    def all_off(self, board: Optional[int] = None) -> None:
+        """
+        Turn off all channels of ``board`` (default: all boards) ahead of any
+        queued frame.  Frames queued earlier for the board are superseded.
+        """
+        boards = range(len(self.boards)) if board is None else [board]
+        for board_ in boards:
+            self._push(PRIORITY_ALL_OFF,
+                       _Request(board_, None, None, self.clock(), True))
+
+    def _pop(self, block: bool) -> Optional[_Request]:
+        # Return next request to write, skipping (and counting) superseded
+        # and missed frames; ``None`` if the queue is empty (or stopped).
+        with self._condition:
+            while True:
+                while block and self._running and not self._queue:
+                    self._condition.wait()
+                if not self._queue:
+                    return None
+                priority, sequence, request = heapq.heappop(self._queue)
+                stats = self.stats[request.board]
+                if request.all_off:
+                    return request
+                if sequence != self._latest[request.board]:
+                    stats['superseded'] += 1
+                elif request.deadline is not None and \
+                        self.clock() > request.deadline:
+                    stats['missed'] += 1
+                else:
+                    return request
+
+    def _execute(self, request: _Request) -> None:
+        board = self.boards[request.board]
+        latency = self.clock() - request.submitted
+        if request.all_off:
+            # Drop deferred state (if any) rather than writing it, so no
+            # channel is turned on just before the all-off, and it cannot
+            # override the all-off afterwards.
+            board.discard_pending()
+            board.write_ports(np.zeros(board.shift_register_count,
+                                       dtype=np.uint8))
+        else:
+            board.set_state_of_all_channels(request.state)
+        with self._condition:
+            stats = self.stats[request.board]
+            stats['all_off' if request.all_off else 'written'] += 1
+            stats['latency_total'] += latency
+            stats['latency_max'] = max(stats['latency_max'], latency)
+
+    def run_pending(self) -> int:
+        """
+        Serve queued requests (on the calling thread) until the queue is
+        empty.
+
+        Returns
+        -------
+        int
+            Number of requests written.
+        """
+        count = 0
+        while True:
+            request = self._pop(block=False)
+            if request is None:
+                return count
+            self._execute(request)
+            count += 1
+
+    def _run(self) -> None:
+        while True:
+            request = self._pop(block=True)
+            if request is None:
+                if not self._running:
+                    return
+            else:
+                try:
+                    self._execute(request)
+                except Exception as exception:
+                    logger.error(f'Write to board '
+                                 f'{self.boards[request.board].address} '
+                                 f'failed: {exception}')
+
+    def start(self) -> None:
+        """
+        Serve requests on a background thread.
+        """
+        with self._condition:
+            self._running = True
+        self._thread = threading.Thread(target=self._run,
+                                        name='hv-switching-scheduler',
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop background thread (queued requests are served first).
+        """
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def report(self) -> List[Dict]:
+        """
+        Return counters and mean queueing latency (``latency_mean``) of each
+        board.
+        """
+        with self._condition:
+            stats_ = [dict(stats) for stats in self.stats]
+        report = []
+        for board, stats in zip(self.boards, stats_):
+            served = stats['written'] + stats['all_off']
+            report.append(dict(stats, address=board.address,
+                               latency_mean=(stats['latency_total'] / served
+                                             if served else 0.)))
+        return report
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""
+Drive a switching board directly over USB serial using binary frames.
+
+Each request is a single frame::
+
+    [SERIAL_FRAME_START, opcode, n, v1..vn, crc]
+
+and the board answers with::
+
+    [SERIAL_FRAME_START, opcode, return code, n, v1..vn, crc]
+
+where ``crc`` is the `crc8` of all bytes following ``SERIAL_FRAME_START``.
+Text output from the board (e.g., the configuration dump printed at boot) is
+skipped while waiting for a response.
+
+.. versionadded:: 4.2
+"""
+import time
+import logging
+
+import numpy as np
+import serial
+
+from typing import Union, List
+
+from .driver import STATS_DTYPE, crc8, _encode_state, _decode_state
+
+logger = logging.getLogger(__name__)
+
+SERIAL_FRAME_START = 0xA5
+MAX_SERIAL_FRAME_PAYLOAD = 32
+SERIAL_SET_STATE_OF_ALL_CHANNELS = 0x01
+SERIAL_GET_STATE_OF_ALL_CHANNELS = 0x02
+SERIAL_GET_STATS = 0x03
+
+
+class SerialHVSwitchingBoard:
+    def __init__(self, port: str, baud_rate: int = 57600,
+                 shift_register_count: int = 5, timeout: float = 1.,
+                 boot_delay: float = 2.):
+        """
+        Parameters
+        ----------
+        port : str
+            Serial port of switching board (e.g., ``/dev/ttyUSB0``).
+        baud_rate : int, optional
+            Serial baud rate (default: 57600; see
+            `HVSwitchingBoard.bus_settings`).
+        shift_register_count : int, optional
+            Number of shift registers on the board (default: 5).
+        timeout : float, optional
+            Seconds to wait for a response (default: 1).
+        boot_delay : float, optional
+            Seconds to wait for the board to boot after opening the port,
+            which resets the board (default: 2).
+        """
+        self.shift_register_count = shift_register_count
+        self.timeout = timeout
+        self.serial = serial.Serial(port, baud_rate, timeout=timeout)
+        if boot_delay:
+            time.sleep(boot_delay)
+        self.serial.reset_input_buffer()
+
+    def close(self) -> None:
+        self.serial.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def request(self, opcode: int,
+                payload: Union[bytes, List[int]] = b'') -> bytes:
+        """
+        Send request frame and return payload of response frame.
+
+        Parameters
+        ----------
+        opcode : int
+            Frame opcode (e.g., `SERIAL_GET_STATS`).
+        payload : bytes or list, optional
+            Request payload (at most `MAX_SERIAL_FRAME_PAYLOAD` bytes).
+
+        Returns
+        -------
+        bytes
+            Response payload.
+
+        Raises
+        ------
+        IOError
+            If no valid response was received in time, or if the board
+            returned an error code.
+        """
+        payload = bytes(bytearray(payload))
+        if len(payload) > MAX_SERIAL_FRAME_PAYLOAD:
+            raise ValueError(f"Payload of {len(payload)} bytes exceeds "
+                             f"maximum of {MAX_SERIAL_FRAME_PAYLOAD} bytes")
+        body = bytes([opcode, len(payload)]) + payload
+        self.serial.write(bytes([SERIAL_FRAME_START]) + body +
+                          bytes([crc8(body)]))
+        return self._read_response(opcode)
+
+    def _read_response(self, opcode: int) -> bytes:
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            start = self.serial.read(1)
+            if not start:
+                continue
+            elif start[0] != SERIAL_FRAME_START:
+                # Skip text output.
+                continue
+            header = self.serial.read(3)
+            if len(header) < 3:
+                break
+            response_opcode, return_code, length = header
+            body = self.serial.read(length + 1)
+            if len(body) < length + 1:
+                break
+            if crc8(header + body[:-1]) != body[-1]:
+                raise IOError('Bad CRC in response frame.')
+            if response_opcode != opcode:
+                logger.debug(f'Skip response to opcode {response_opcode}')
+                continue
+            if return_code != 0:
+                raise IOError(f'Board returned error code {return_code} for '
+                              f'opcode {opcode}.')
+            return body[:-1]
+        raise IOError(f'No response to opcode {opcode} within '
+                      f'{self.timeout} s.')
+
+    def set_state_of_all_channels(self, state: Union[List, np.array]) -> None:
+        self.request(SERIAL_SET_STATE_OF_ALL_CHANNELS,
+                     _encode_state(state, self.shift_register_count))
+
+    def state_of_all_channels(self) -> np.array:
+        data = self.request(SERIAL_GET_STATE_OF_ALL_CHANNELS)
+        return _decode_state(data, self.shift_register_count)
+
+    def stats(self) -> np.void:
+        """
+        Read firmware performance counters.
+
+        Returns
+        -------
+        numpy.void
+            Counters as a `STATS_DTYPE` record.
+        """
+        data = self.request(SERIAL_GET_STATS)
+        return np.frombuffer(data[:STATS_DTYPE.itemsize],
+                             dtype=STATS_DTYPE).copy()[0]
@@ -0,0 +1,235 @@
+# coding: utf-8
+"""
+Hand fleet frames from a producer process (e.g., a planner) to a driver
+process through shared memory, without pickling frames.  The driver copies
+only the frames it writes (i.e., the latest one) out of shared memory.
+
+The producer writes each frame in place into the next slot of a
+`FrameRing`; the driver loop (`drive()`) only ever handles the latest frame,
+skipping frames that were superseded before it got to them::
+
+    # Producer
+    ring = FrameRing.create((board_count, max_ports), name='hv-frames')
+    with ring.write() as frame:
+        frame[:] = index.pack(state)
+
+    # Driver
+    ring = FrameRing.attach('hv-frames')
+    drive(ring, boards)
+
+Each slot has a sequence counter, updated seqlock-style (odd while the slot
+is being written), so a reader detects frames overwritten while it was
+reading them.
+
+Requires Python 3.8 or later (`multiprocessing.shared_memory`).
+
+.. versionadded:: 4.2
+"""
+import time
+import struct
+import logging
+import threading
+
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python < 3.8.
+    shared_memory = None
+
+import numpy as np
+
+from .driver import HVSwitchingBoard
+from .fleet import FleetState
+
+logger = logging.getLogger(__name__)
+
+#: Ring header ``(magic, version, slot_count, board_count, max_ports)``,
+#: followed by the ``uint64`` sequence number of the latest frame.
+RING_HEADER = struct.Struct('<4sHHII')
+RING_MAGIC = b'HVFR'
+RING_VERSION = 1
+_HEAD_OFFSET = 16
+
+
+def _align(size: int) -> int:
+    return (size + 7) // 8 * 8
+
+
+def _require_shared_memory() -> None:
+    if shared_memory is None:
+        raise RuntimeError('Frame rings require Python 3.8 or later '
+                           '(`multiprocessing.shared_memory`).')
+
+
+class FrameRing:
+    def __init__(self, shm: 'shared_memory.SharedMemory',
+                 owner: bool = False):
+        """
+        Use `create()` or `attach()` instead.
+        """
+        self.shm = shm
+        self.owner = owner
+        magic, version, slot_count, board_count, max_ports = \
+            RING_HEADER.unpack_from(shm.buf, 0)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            raise ValueError(f"Shared memory `{shm.name}` is not a version "
+                             f"{RING_VERSION} frame ring")
+        self.slot_count = slot_count
+        self.shape = (board_count, max_ports)
+        frame_size = board_count * max_ports
+        slot_size = 8 + _align(frame_size)
+        self._head = np.ndarray((1, ), dtype='<u8', buffer=shm.buf,
+                                offset=_HEAD_OFFSET)
+        self._slot_sequences = [np.ndarray((1, ), dtype='<u8', buffer=shm.buf,
+                                           offset=24 + i * slot_size)
+                                for i in range(slot_count)]
+        self._frames = [np.ndarray(self.shape, dtype=np.uint8, buffer=shm.buf,
+                                   offset=24 + i * slot_size + 8)
+                        for i in range(slot_count)]
+
+    @classmethod
+    def create(cls, shape: Tuple[int, int], slot_count: int = 8,
+               name: Optional[str] = None) -> 'FrameRing':
+        """
+        Create ring of ``slot_count`` frames of ``shape`` ``(board_count,
+        max_ports)`` (e.g., `RoutingIndex.pack` output).
+        """
+        _require_shared_memory()
+        board_count, max_ports = shape
+        size = 24 + slot_count * (8 + _align(board_count * max_ports))
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        RING_HEADER.pack_into(shm.buf, 0, RING_MAGIC, RING_VERSION,
+                              slot_count, board_count, max_ports)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> 'FrameRing':
+        """
+        Attach to existing ring.
+        """
+        _require_shared_memory()
+        return cls(shared_memory.SharedMemory(name=name))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def head(self) -> int:
+        """
+        Sequence number of latest complete frame (``0`` if none).
+        """
+        return int(self._head[0])
+
+    def close(self) -> None:
+        # Release views before closing the shared memory.
+        self._head = self._slot_sequences = self._frames = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def write(self):
+        """
+        Write next frame in place (single producer).
+
+        Yields
+        ------
+        numpy.array
+            Frame of next slot, to fill in place; published on exit.
+        """
+        sequence = self.head + 1
+        slot = sequence % self.slot_count
+        self._slot_sequences[slot][0] = 2 * sequence + 1
+        yield self._frames[slot]
+        self._slot_sequences[slot][0] = 2 * sequence
+        self._head[0] = sequence
+
+    def publish(self, frame: np.array) -> int:
+        """
+        Copy ``frame`` into next slot and publish it.
+
+        Returns
+        -------
+        int
+            Sequence number of frame.
+        """
+        with self.write() as slot:
+            slot[:] = frame
+        return self.head
+
+    def frame(self, sequence: int) -> np.array:
+        """
+        Return view of frame ``sequence`` (valid only while `valid()`).
+        """
+        return self._frames[sequence % self.slot_count]
+
+    def valid(self, sequence: int) -> bool:
+        """
+        Return ``True`` if frame ``sequence`` is complete and has not been
+        overwritten.
+        """
+        slot = sequence % self.slot_count
+        return int(self._slot_sequences[slot][0]) == 2 * sequence
+
+
+def drive(ring: FrameRing, boards: Sequence[HVSwitchingBoard],
+          fleet: Optional[FleetState] = None,
+          stop: Optional[threading.Event] = None,
+          poll_interval: float = 0.0005) -> Dict[str, int]:
+    """
+    Write the latest frame of ``ring`` to ``boards`` whenever a new one is
+    published, until ``stop`` is set.
+
+    Each frame is copied out of shared memory just before writing, and only
+    its changed ports are written (see `FleetState.update`); stale frames are
+    skipped.
+
+    Parameters
+    ----------
+    ring : FrameRing
+    boards : list
+        Boards, in frame board order.
+    fleet : FleetState, optional
+        Fleet shadow (default: new shadow, i.e., all boards unknown).
+    stop : threading.Event, optional
+        Stop event (default: run forever).
+    poll_interval : float, optional
+        Seconds to sleep while no new frame is available.
+
+    Returns
+    -------
+    dict
+        ``frames`` (written), ``skipped`` (superseded before being read) and
+        ``torn`` (overwritten while being read) frame counts.
+    """
+    fleet = fleet or FleetState([board.shift_register_count
+                                 for board in boards])
+    counters = {'frames': 0, 'skipped': 0, 'torn': 0}
+    last = ring.head
+    while stop is None or not stop.is_set():
+        sequence = ring.head
+        if sequence == last:
+            time.sleep(poll_interval)
+            continue
+        counters['skipped'] += sequence - last - 1
+        last = sequence
+        # Copy frame out of the shared slot, then check the slot was not
+        # overwritten meanwhile.
+        frame = ring.frame(sequence).copy()
+        if not ring.valid(sequence):
+            counters['torn'] += 1
+            continue
+        fleet.update(boards, frame)
+        counters['frames'] += 1
+    return counters
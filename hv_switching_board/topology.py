@@ -0,0 +1,139 @@
+# coding: utf-8
+"""
+Persistent cache of switching board topology (e.g., shift register count),
+so new processes do not need to query every board on startup.
+
+The cache is a versioned JSON file::
+
+    {"version": 1,
+     "namespaces": {"<namespace>": {"<address>": {"shift_register_count": 5}}}}
+
+Namespaces separate boards sharing an I2C address on different buses (e.g.,
+use the serial port or serial number of each proxy as the namespace).
+
+.. versionadded:: 4.2
+"""
+import json
+import os
+import logging
+import tempfile
+import threading
+
+from typing import Optional, Dict
+
+logger = logging.getLogger(__name__)
+
+#: Layout version of cache file.
+TOPOLOGY_CACHE_VERSION = 1
+
+
+def default_cache_filename() -> str:
+    """
+    Return default topology cache file path (in the user cache directory).
+    """
+    cache_dir = os.environ.get('XDG_CACHE_HOME',
+                               os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_dir, 'hv-switching-board', 'topology.json')
+
+
+def write_json(filename: str, data: Dict) -> None:
+    """
+    Write ``data`` to JSON file atomically (i.e., to a temporary file, then
+    renamed), so concurrent readers never see a partially written file.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as output:
+            json.dump(data, output, indent=2, sort_keys=True)
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+
+class TopologyCache:
+    def __init__(self, filename: Optional[str] = None, namespace: str = ''):
+        """
+        Parameters
+        ----------
+        filename : str, optional
+            Cache file path (default: `default_cache_filename()`).
+        namespace : str, optional
+            Namespace of boards (e.g., serial port of proxy).
+        """
+        self.filename = filename or default_cache_filename()
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._boards = None
+
+    def _read(self) -> Dict:
+        try:
+            with open(self.filename, 'r') as input_:
+                data = json.load(input_)
+        except FileNotFoundError:
+            return {}
+        except (IOError, ValueError) as exception:
+            logger.debug(f'Ignore unreadable topology cache `{self.filename}`: '
+                         f'{exception}')
+            return {}
+        if not isinstance(data, dict) or \
+                data.get('version') != TOPOLOGY_CACHE_VERSION:
+            logger.debug(f'Ignore topology cache `{self.filename}` with '
+                         f'unsupported version')
+            return {}
+        return data.get('namespaces', {})
+
+    def _write(self, namespaces: Dict) -> None:
+        write_json(self.filename, {'version': TOPOLOGY_CACHE_VERSION,
+                                   'namespaces': namespaces})
+
+    def _modify(self, address: Optional[int], entry: Optional[Dict]) -> None:
+        with self._lock:
+            # Re-read file to keep changes made by other processes.
+            namespaces = self._read()
+            boards = namespaces.setdefault(self.namespace, {})
+            if address is None:
+                boards.clear()
+            elif entry is None:
+                boards.pop(str(address), None)
+            else:
+                boards.setdefault(str(address), {}).update(entry)
+            self._write(namespaces)
+            self._boards = boards
+
+    def get(self, address: int) -> Dict:
+        """
+        Return cached topology of board at ``address`` (empty if unknown).
+        """
+        with self._lock:
+            if self._boards is None:
+                self._boards = self._read().get(self.namespace, {})
+            return dict(self._boards.get(str(address), {}))
+
+    def shift_register_count(self, address: int) -> Optional[int]:
+        """
+        Return cached shift register count of board at ``address``, or
+        ``None`` if unknown.
+        """
+        return self.get(address).get('shift_register_count')
+
+    def update(self, address: int, **entry) -> None:
+        """
+        Update cached topology of board at ``address`` (e.g.,
+        ``update(32, shift_register_count=5)``).
+        """
+        self._modify(address, entry)
+
+    def invalidate(self, address: int) -> None:
+        """
+        Remove cached topology of board at ``address``.
+        """
+        self._modify(address, None)
+
+    def clear(self) -> None:
+        """
+        Remove cached topology of all boards in namespace.
+        """
+        self._modify(None, None)
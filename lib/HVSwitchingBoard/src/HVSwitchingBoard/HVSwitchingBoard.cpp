@@ -4,7 +4,9 @@
 #define P(str) (strcpy_P(p_buffer_, PSTR(str)), p_buffer_)
 
 void shiftOutFast(uint8_t dataPin, uint8_t clockPin, uint8_t bitOrder, uint8_t val);
+uint16_t free_ram();
 HVSwitchingBoardClass HVSwitchingBoard;
+volatile uint16_t HVSwitchingBoardClass::wire_overruns_ = 0;
 
 const char BaseNode::PROTOCOL_NAME_[] PROGMEM = "Extension module protocol";
 const char BaseNode::PROTOCOL_VERSION_[] PROGMEM = "0.1";
@@ -14,7 +16,18 @@ const char BaseNode::HARDWARE_VERSION_[] PROGMEM = ___HARDWARE_VERSION___;
 const char BaseNode::SOFTWARE_VERSION_[] PROGMEM = ___SOFTWARE_VERSION___;
 const char BaseNode::URL_[] PROGMEM = "https://github.com/sci-bots/dropbot";
 
-HVSwitchingBoardClass::HVSwitchingBoardClass() {}
+HVSwitchingBoardClass::HVSwitchingBoardClass() : loop_count_(0),
+                                                 loop_rate_start_ms_(0),
+                                                 active_timers_(0),
+                                                 last_sequence_(0),
+                                                 last_frame_status_(RETURN_OK),
+                                                 rejected_frames_(0),
+                                                 sequence_gaps_(0),
+                                                 on_time_update_ms_(0) {
+  memset(&stats_, 0, sizeof(stats_));
+  memset(on_time_ms_, 0, sizeof(on_time_ms_));
+  memset(applied_channels_, 0, sizeof(applied_channels_));
+}
 
 void HVSwitchingBoardClass::begin(uint32_t baud_rate) {
   /*
@@ -23,8 +36,26 @@ void HVSwitchingBoardClass::begin(uint32_t baud_rate) {
    *
    * .. versionchanged:: 0.13
    *    Fill ``state_of_channels_`` as **active HIGH**.
+   *
+   * .. versionchanged:: 4.2
+   *    Count I2C receive overruns.  Use I2C rate from persistent settings.
+   *    Preload pattern slots.
    */
+  load_settings();
+  begin_hardware(baud_rate);
+}
+
+void HVSwitchingBoardClass::begin() {
+  /*
+   * .. versionadded:: 4.2
+   */
+  load_settings();
+  begin_hardware(settings_.baud_rate);
+}
+
+void HVSwitchingBoardClass::begin_hardware(uint32_t baud_rate) {
   BaseNode::begin(baud_rate);
+  Wire.onReceive(handle_wire_receive);
 
 #if ___HARDWARE_MAJOR_VERSION___==2
   // Version 2 hardware uses **software** SPI.
@@ -49,8 +80,10 @@ void HVSwitchingBoardClass::begin(uint32_t baud_rate) {
   memset(state_of_channels_, 0, sizeof(state_of_channels_));
   update_all_channels();
 
+  load_patterns();
+
   // set the i2c clock
-  Wire.setClock(HV_SWITCHING_BOARD_I2C_RATE);
+  Wire.setClock(settings_.i2c_rate);
 
   // By default, enable receiving of broadcast messages (i.e., messages sent to
   // address 0).  This can be enabled/disabled through the
@@ -58,6 +91,44 @@ void HVSwitchingBoardClass::begin(uint32_t baud_rate) {
   general_call(true);
 }
 
+void HVSwitchingBoardClass::load_settings(bool use_defaults) {
+  eeprom_read_block((void *)&settings_, (const void *)EEPROM_SETTINGS_ADDRESS,
+                    sizeof(settings_));
+
+  if (!use_defaults && (settings_.version == 1)) {
+    // Version 1 settings have no group mask.
+    settings_.version = SETTINGS_VERSION;
+    settings_.groups = 0;
+    save_settings();
+  }
+
+  if (use_defaults || (settings_.version != SETTINGS_VERSION)) {
+    settings_.version = SETTINGS_VERSION;
+    settings_.i2c_rate = HV_SWITCHING_BOARD_I2C_RATE;
+    settings_.baud_rate = HV_SWITCHING_BOARD_BAUD_RATE;
+    settings_.groups = 0;
+    save_settings();
+    return;
+  }
+
+  // Reset invalid fields only, keeping the other persisted settings.  The
+  // build default baud rate is always accepted (e.g., 115200 on version 2.1
+  // hardware, although not exact with an 8 MHz clock).
+  bool changed = false;
+  if (!valid_i2c_rate(settings_.i2c_rate)) {
+    settings_.i2c_rate = HV_SWITCHING_BOARD_I2C_RATE;
+    changed = true;
+  }
+  if ((settings_.baud_rate != HV_SWITCHING_BOARD_BAUD_RATE) &&
+      !valid_baud_rate(settings_.baud_rate)) {
+    settings_.baud_rate = HV_SWITCHING_BOARD_BAUD_RATE;
+    changed = true;
+  }
+  if (changed) {
+    save_settings();
+  }
+}
+
 void HVSwitchingBoardClass::process_wire_command() {
   /*
    * .. versionchanged:: 0.8
@@ -65,6 +136,19 @@ void HVSwitchingBoardClass::process_wire_command() {
    *
    * .. versionchanged:: 0.10
    *    Add command to reset configuration.
+   *
+   * .. versionchanged:: 4.2
+   *    Add performance counters.
+   *    Add echo/sink/source benchmark commands.
+   *    Add I2C rate/baud rate settings commands.
+   *    Also reset I2C rate/baud rate settings on `CMD_RESET_CONFIG`.
+   *    Add state of all channels commands and frame status command.
+   *    Add burst command.
+   *    Add pattern slot commands.
+   *    Add auto-off timer commands.
+   *    Add on time commands.
+   *    Add multicast group commands.
+   *    Add capabilities command.
    */
   return_code_ = RETURN_UNKNOWN_COMMAND;
   uint8_t register_addr = cmd_ & B00111111;
@@ -75,20 +159,147 @@ void HVSwitchingBoardClass::process_wire_command() {
       (register_addr <= PCA9505_CONFIG_IO_REGISTER_ + SHIFT_REGISTER_COUNT - 1)) {
     // Emulate the PCA9505 config io registers (used by the control board to
     // determine the chip type)
+    stats_.config_commands++;
     port_operation(config_io_register_, register_addr -
                    PCA9505_CONFIG_IO_REGISTER_, auto_increment);
   } else if ((register_addr >= PCA9505_OUTPUT_PORT_REGISTER_) &&
              (register_addr <= PCA9505_OUTPUT_PORT_REGISTER_ + SHIFT_REGISTER_COUNT - 1)) {
     // Emulate the PCA9505 output registers.
-    if (port_operation(state_of_channels_, register_addr -
-                       PCA9505_OUTPUT_PORT_REGISTER_, auto_increment,
-                       // Invert from **active LOW** to **active HIGH**.
-                       true) > 0) {
-      // At least one port was updated.  Propagate update to channel states.
+    if (payload_length_ == 0) {
+      stats_.port_reads++;
+    } else {
+      stats_.port_writes++;
+    }
+    const uint8_t port = register_addr - PCA9505_OUTPUT_PORT_REGISTER_;
+    const int count = port_operation(state_of_channels_, port,
+                                     auto_increment,
+                                     // Invert from **active LOW** to
+                                     // **active HIGH**.
+                                     true);
+    if (count > 0) {
+      // At least one port was updated.  Written ports are now set explicitly,
+      // so pending auto-off timers must not override them.
+      uint8_t mask[SHIFT_REGISTER_COUNT] = {0};
+      memset(mask + port, 0xFF, count);
+      release_timers(mask);
+      // Propagate update to channel states.
       update_all_channels();
     }
   } else {
+    // `BaseNode` reserves command codes below `0xA0`.
+    if (cmd_ < 0xA0) {
+      stats_.base_commands++;
+    } else {
+      stats_.board_commands++;
+    }
     switch (cmd_) {
+      case CMD_SET_STATE_OF_ALL_CHANNELS:
+        if (payload_length_ == SHIFT_REGISTER_COUNT) {
+          set_state_of_all_channels((const uint8_t *)buffer_);
+          return_code_ = RETURN_OK;
+        } else if (payload_length_ == SHIFT_REGISTER_COUNT + 2) {
+          process_sequenced_frame();
+        } else {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        }
+        break;
+      case CMD_GET_STATE_OF_ALL_CHANNELS:
+        for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+          // Invert from **active HIGH** to **active LOW**.
+          const uint8_t value = ~state_of_channels_[i];
+          serialize(&value, sizeof(value));
+        }
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_GET_FRAME_STATUS:
+        serialize(&last_sequence_, sizeof(last_sequence_));
+        serialize(&last_frame_status_, sizeof(last_frame_status_));
+        serialize(&rejected_frames_, sizeof(rejected_frames_));
+        serialize(&sequence_gaps_, sizeof(sequence_gaps_));
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_PLAY_BURST:
+        play_burst();
+        break;
+      case CMD_SAVE_PATTERN:
+      case CMD_RECALL_PATTERN:
+      case CMD_SET_PATTERN:
+      case CMD_GET_PATTERN:
+        process_pattern_command();
+        break;
+      case CMD_ACTUATE_FOR:
+        actuate_for();
+        break;
+      case CMD_CANCEL_TIMERS:
+        active_timers_ = 0;
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_GET_ON_TIME:
+        if (payload_length_ != 2) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          const uint8_t offset = read<uint8_t>();
+          const uint8_t count = read<uint8_t>();
+          if (count > MAX_ON_TIME_COUNT) {
+            return_code_ = RETURN_MAX_PAYLOAD_EXCEEDED;
+          } else if (offset + count > SHIFT_REGISTER_COUNT * 8) {
+            return_code_ = RETURN_BAD_INDEX;
+          } else {
+            update_on_time();
+            serialize(&on_time_ms_[offset], count * sizeof(uint32_t));
+            return_code_ = RETURN_OK;
+          }
+        }
+        break;
+      case CMD_SET_GROUPS:
+        if (payload_length_ != 1) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          settings_.groups = read<uint8_t>();
+          save_settings();
+          return_code_ = RETURN_OK;
+        }
+        break;
+      case CMD_GET_GROUPS:
+        serialize(&settings_.groups, sizeof(settings_.groups));
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_GROUP_SET_STATE:
+        if (payload_length_ != 1 + SHIFT_REGISTER_COUNT) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          if (read<uint8_t>() & settings_.groups) {
+            set_state_of_all_channels((const uint8_t *)buffer_ + bytes_read_);
+          }
+          return_code_ = RETURN_OK;
+        }
+        break;
+      case CMD_GROUP_CLEAR:
+        if (payload_length_ != 1) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          if (read<uint8_t>() & settings_.groups) {
+            memset(state_of_channels_, 0, sizeof(state_of_channels_));
+            active_timers_ = 0;
+            update_all_channels();
+          }
+          return_code_ = RETURN_OK;
+        }
+        break;
+      case CMD_GET_CAPABILITIES:
+        {
+          const uint32_t capabilities = CAPABILITIES;
+          const uint8_t shift_register_count = SHIFT_REGISTER_COUNT;
+          serialize(&capabilities, sizeof(capabilities));
+          serialize(&shift_register_count, sizeof(shift_register_count));
+          return_code_ = RETURN_OK;
+        }
+        break;
+      case CMD_RESET_ON_TIME:
+        memset(on_time_ms_, 0, sizeof(on_time_ms_));
+        on_time_update_ms_ = millis();
+        return_code_ = RETURN_OK;
+        break;
       case CMD_GET_GENERAL_CALL_ENABLED:
         {
           const uint8_t general_call_enabled = general_call();
@@ -110,6 +321,82 @@ void HVSwitchingBoardClass::process_wire_command() {
         }
         return_code_ = RETURN_OK;
         break;
+      case CMD_GET_STATS:
+        serialize(&stats(), sizeof(stats_));
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_RESET_STATS:
+        {
+          ATOMIC_BLOCK(ATOMIC_RESTORESTATE) {
+            wire_overruns_ = 0;
+          }
+          memset(&stats_, 0, sizeof(stats_));
+        }
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_ECHO:
+        // Payload is already in `buffer_`; send it back in place.
+        serialize(buffer_, payload_length_);
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_SINK:
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_SOURCE:
+        if (payload_length_ != 1) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          const uint8_t count = read<uint8_t>();
+          if (count > MAX_WIRE_PAYLOAD) {
+            return_code_ = RETURN_MAX_PAYLOAD_EXCEEDED;
+          } else {
+            for (uint8_t i = 0; i < count; i++) {
+              serialize(&i, sizeof(i));
+            }
+            return_code_ = RETURN_OK;
+          }
+        }
+        break;
+      case CMD_GET_BUS_SETTINGS:
+        {
+          const uint32_t i2c_rate = settings_.i2c_rate;
+          const uint32_t baud_rate = settings_.baud_rate;
+          serialize(&i2c_rate, sizeof(i2c_rate));
+          serialize(&baud_rate, sizeof(baud_rate));
+        }
+        return_code_ = RETURN_OK;
+        break;
+      case CMD_SET_I2C_RATE:
+        if (payload_length_ != sizeof(uint32_t)) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          const uint32_t i2c_rate = read<uint32_t>();
+          if (!valid_i2c_rate(i2c_rate)) {
+            return_code_ = RETURN_BAD_VALUE;
+          } else {
+            settings_.i2c_rate = i2c_rate;
+            save_settings();
+            Wire.setClock(settings_.i2c_rate);
+            return_code_ = RETURN_OK;
+          }
+        }
+        break;
+      case CMD_SET_BAUD_RATE:
+        if (payload_length_ != sizeof(uint32_t)) {
+          return_code_ = RETURN_BAD_PACKET_SIZE;
+        } else {
+          const uint32_t baud_rate = read<uint32_t>();
+          if (!valid_baud_rate(baud_rate)) {
+            return_code_ = RETURN_BAD_VALUE;
+          } else {
+            // Changing the baud rate of the open serial connection would
+            // break it, so the new rate takes effect after reboot.
+            settings_.baud_rate = baud_rate;
+            save_settings();
+            return_code_ = RETURN_OK;
+          }
+        }
+        break;
       case CMD_REBOOT:
         // Reboot.
         Serial.println("Rebooting...");
@@ -122,30 +409,74 @@ void HVSwitchingBoardClass::process_wire_command() {
         break;
       case CMD_RESET_CONFIG:
         load_config(true);
+        load_settings(true);
+        Wire.setClock(settings_.i2c_rate);
+        return_code_ = RETURN_OK;
         break;
       default:
         BaseNode::process_wire_command();
         break;
     }
   }
+
+  if (return_code_ == RETURN_GENERAL_ERROR) {
+    stats_.general_errors++;
+  } else if (return_code_ == RETURN_UNKNOWN_COMMAND) {
+    stats_.unknown_commands++;
+  }
+}
+
+void HVSwitchingBoardClass::listen() {
+  if (Serial.available() && (Serial.peek() == SERIAL_FRAME_START)) {
+    // Handle binary frame before `BaseNode` consumes it as a text command.
+    process_serial_frame();
+  }
+  BaseNode::listen();
+  if (active_timers_) {
+    update_timers();
+  }
+
+  loop_count_++;
+  const uint32_t now = millis();
+  if (now - loop_rate_start_ms_ >= 1000) {
+    stats_.loop_rate = loop_count_;
+    loop_count_ = 0;
+    loop_rate_start_ms_ = now;
+  }
+}
+
+void HVSwitchingBoardClass::handle_wire_receive(int n_bytes) {
+  if (wire_command_received_ || (n_bytes - 1 > MAX_PAYLOAD_LENGTH)) {
+    // Previous command has not been processed yet (it is about to be
+    // overwritten), or payload does not fit in command buffer.
+    wire_overruns_++;
+  }
+  BaseNode::handle_wire_receive(n_bytes);
 }
 
 bool HVSwitchingBoardClass::process_serial_input() {
   /*
    * .. versionchanged:: 0.8
    *    Add ``reboot()`` serial command.
+   *
+   * .. versionchanged:: 4.2
+   *    Print state without allocating ``String`` objects, and match command
+   *    names directly from program memory.
    */
   if (BaseNode::process_serial_input()) {
     return true;
   }
 
-  if (match_function(P("state_of_all_channels()"))) {
+  if (match_function_P(PSTR("state_of_all_channels()"))) {
     for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
-      Serial.println("state_of_channels_[" + String(i) + "]=" + String(state_of_channels_[i]));
+      Serial.print(F("state_of_channels_["));
+      Serial.print(i);
+      Serial.print(F("]="));
+      Serial.println(state_of_channels_[i]);
     }
     return true;
-  } else if (match_function(P("reboot()"))) {
-    Serial.println("Rebooting...");
+  } else if (match_function_P(PSTR("reboot()"))) {
+    Serial.println(F("Rebooting..."));
     do {
       wdt_enable(WDTO_15MS);
       for(;;)
@@ -156,13 +487,379 @@ bool HVSwitchingBoardClass::process_serial_input() {
   return false;
 }
 
+void HVSwitchingBoardClass::process_serial_frame() {
+  /*
+   * .. versionadded:: 4.2
+   */
+  const uint32_t deadline_ms = millis() + SERIAL_FRAME_TIMEOUT_MS;
+  // Header: start byte, opcode, payload length.
+  uint8_t header[3];
+  // Payload, followed by CRC.
+  uint8_t payload[MAX_SERIAL_FRAME_PAYLOAD + 1];
+
+  if (!read_serial_bytes(header, sizeof(header), deadline_ms)) {
+    // Incomplete frame; discard.
+    return;
+  }
+  const uint8_t opcode = header[1];
+  const uint8_t length = header[2];
+  if (length > MAX_SERIAL_FRAME_PAYLOAD) {
+    write_serial_frame(opcode, RETURN_MAX_PAYLOAD_EXCEEDED, NULL, 0);
+    return;
+  }
+  if (!read_serial_bytes(payload, length + 1, deadline_ms)) {
+    write_serial_frame(opcode, RETURN_TIMEOUT, NULL, 0);
+    return;
+  }
+
+  uint8_t crc = _crc8_ccitt_update(_crc8_ccitt_update(0, opcode), length);
+  for (uint8_t i = 0; i < length; i++) {
+    crc = _crc8_ccitt_update(crc, payload[i]);
+  }
+  if (crc != payload[length]) {
+    write_serial_frame(opcode, RETURN_BAD_CRC, NULL, 0);
+    return;
+  }
+
+  switch (opcode) {
+    case SERIAL_SET_STATE_OF_ALL_CHANNELS:
+      if (length != SHIFT_REGISTER_COUNT) {
+        write_serial_frame(opcode, RETURN_BAD_PACKET_SIZE, NULL, 0);
+      } else {
+        set_state_of_all_channels(payload);
+        write_serial_frame(opcode, RETURN_OK, NULL, 0);
+      }
+      break;
+    case SERIAL_GET_STATE_OF_ALL_CHANNELS:
+      for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+        payload[i] = ~state_of_channels_[i];
+      }
+      write_serial_frame(opcode, RETURN_OK, payload, SHIFT_REGISTER_COUNT);
+      break;
+    case SERIAL_GET_STATS:
+      write_serial_frame(opcode, RETURN_OK, (const uint8_t *)&stats(),
+                         sizeof(stats_));
+      break;
+    default:
+      write_serial_frame(opcode, RETURN_UNKNOWN_COMMAND, NULL, 0);
+      break;
+  }
+}
+
+bool HVSwitchingBoardClass::read_serial_bytes(uint8_t *data, uint8_t count,
+                                              uint32_t deadline_ms) {
+  uint8_t i = 0;
+  while (i < count) {
+    if (Serial.available()) {
+      data[i++] = Serial.read();
+    } else if ((int32_t)(millis() - deadline_ms) >= 0) {
+      return false;
+    }
+  }
+  return true;
+}
+
+void HVSwitchingBoardClass::write_serial_frame(uint8_t opcode,
+                                               uint8_t return_code,
+                                               const uint8_t *payload,
+                                               uint8_t length) {
+  uint8_t crc = _crc8_ccitt_update(0, opcode);
+  crc = _crc8_ccitt_update(crc, return_code);
+  crc = _crc8_ccitt_update(crc, length);
+  for (uint8_t i = 0; i < length; i++) {
+    crc = _crc8_ccitt_update(crc, payload[i]);
+  }
+  Serial.write(SERIAL_FRAME_START);
+  Serial.write(opcode);
+  Serial.write(return_code);
+  Serial.write(length);
+  if (length > 0) {
+    Serial.write(payload, length);
+  }
+  Serial.write(crc);
+}
+
+void HVSwitchingBoardClass::set_state_of_all_channels(const uint8_t *ports) {
+  for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+    // Invert from **active LOW** to **active HIGH**.
+    state_of_channels_[i] = ~ports[i];
+  }
+  // All channels are now set explicitly, so drop pending auto-off timers.
+  active_timers_ = 0;
+  update_all_channels();
+}
+
+void HVSwitchingBoardClass::process_sequenced_frame() {
+  const uint8_t *frame = (const uint8_t *)buffer_;
+  const uint8_t sequence = frame[0];
+  uint8_t crc = 0;
+  for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT + 1; i++) {
+    crc = _crc8_ccitt_update(crc, frame[i]);
+  }
+
+  if (crc != frame[SHIFT_REGISTER_COUNT + 1]) {
+    rejected_frames_++;
+    last_frame_status_ = RETURN_BAD_CRC;
+  } else {
+    if (sequence != (uint8_t)(last_sequence_ + 1)) {
+      // At least one frame was lost (or the host restarted its sequence).
+      sequence_gaps_++;
+    }
+    set_state_of_all_channels(frame + 1);
+    last_sequence_ = sequence;
+    last_frame_status_ = RETURN_OK;
+  }
+  return_code_ = last_frame_status_;
+}
+
+void HVSwitchingBoardClass::play_burst() {
+  const uint8_t frame_size = sizeof(uint16_t) + SHIFT_REGISTER_COUNT;
+  if ((payload_length_ < 1) || (payload_length_ > MAX_WIRE_PAYLOAD)) {
+    return_code_ = RETURN_BAD_PACKET_SIZE;
+    return;
+  }
+  const uint8_t count = read<uint8_t>();
+  if ((count == 0) || (payload_length_ != 1 + count * frame_size)) {
+    return_code_ = RETURN_BAD_PACKET_SIZE;
+    return;
+  }
+
+  // Copy burst out of the command buffer, since an I2C receive during the
+  // burst would overwrite it.
+  uint8_t burst[MAX_WIRE_PAYLOAD];
+  memcpy(burst, buffer_ + bytes_read_, payload_length_ - 1);
+  const uint8_t *dwells = burst;
+  const uint8_t *frames = burst + count * sizeof(uint16_t);
+
+  uint32_t deadline_us = micros();
+  for (uint8_t i = 0; i < count; i++) {
+    set_state_of_all_channels(frames + i * SHIFT_REGISTER_COUNT);
+    uint16_t dwell_us;
+    memcpy(&dwell_us, dwells + i * sizeof(uint16_t), sizeof(dwell_us));
+    deadline_us += dwell_us;
+    while ((int32_t)(micros() - deadline_us) < 0) {}
+  }
+  return_code_ = RETURN_OK;
+}
+
+void HVSwitchingBoardClass::process_pattern_command() {
+  if (payload_length_ < 1) {
+    return_code_ = RETURN_BAD_PACKET_SIZE;
+    return;
+  }
+  const uint8_t slot = read<uint8_t>();
+  if (slot >= PATTERN_SLOT_COUNT) {
+    return_code_ = RETURN_BAD_INDEX;
+    return;
+  }
+  const bool valid = valid_patterns_ & (1 << slot);
+
+  switch (cmd_) {
+    case CMD_SAVE_PATTERN:
+      memcpy(patterns_[slot], state_of_channels_, SHIFT_REGISTER_COUNT);
+      valid_patterns_ |= (1 << slot);
+      // Keep existing name, if any.
+      save_pattern(slot, valid ? NULL : "");
+      return_code_ = RETURN_OK;
+      break;
+    case CMD_RECALL_PATTERN:
+      if (!valid) {
+        return_code_ = RETURN_BAD_INDEX;
+      } else {
+        memcpy(state_of_channels_, patterns_[slot], SHIFT_REGISTER_COUNT);
+        active_timers_ = 0;
+        update_all_channels();
+        return_code_ = RETURN_OK;
+      }
+      break;
+    case CMD_SET_PATTERN:
+      if (payload_length_ == 1) {
+        // Erase slot.
+        valid_patterns_ &= ~(1 << slot);
+        persistent_write(EEPROM_PATTERNS_ADDRESS + slot * sizeof(Pattern),
+                         0);
+        return_code_ = RETURN_OK;
+      } else if ((payload_length_ < 1 + SHIFT_REGISTER_COUNT) ||
+                 (payload_length_ > 1 + SHIFT_REGISTER_COUNT +
+                  PATTERN_NAME_LENGTH)) {
+        return_code_ = RETURN_BAD_PACKET_SIZE;
+      } else {
+        char name[PATTERN_NAME_LENGTH];
+        const uint8_t name_length = payload_length_ - 1 -
+          SHIFT_REGISTER_COUNT;
+        for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+          // Invert from **active LOW** to **active HIGH**.
+          patterns_[slot][i] = ~read<uint8_t>();
+        }
+        memset(name, 0, sizeof(name));
+        memcpy(name, buffer_ + bytes_read_, name_length);
+        valid_patterns_ |= (1 << slot);
+        save_pattern(slot, name);
+        return_code_ = RETURN_OK;
+      }
+      break;
+    case CMD_GET_PATTERN:
+      {
+        Pattern pattern;
+        eeprom_read_block((void *)&pattern,
+                          (const void *)(EEPROM_PATTERNS_ADDRESS +
+                                         slot * sizeof(Pattern)),
+                          sizeof(pattern));
+        const uint8_t valid_ = valid;
+        serialize(&valid_, sizeof(valid_));
+        for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+          // Invert from **active HIGH** to **active LOW**.
+          const uint8_t value = ~patterns_[slot][i];
+          serialize(&value, sizeof(value));
+        }
+        if (!valid) {
+          memset(pattern.name, 0, sizeof(pattern.name));
+        }
+        serialize(pattern.name, sizeof(pattern.name));
+      }
+      return_code_ = RETURN_OK;
+      break;
+  }
+}
+
+void HVSwitchingBoardClass::actuate_for() {
+  if (payload_length_ != sizeof(uint16_t) + SHIFT_REGISTER_COUNT) {
+    return_code_ = RETURN_BAD_PACKET_SIZE;
+    return;
+  }
+  const uint16_t duration_ms = read<uint16_t>();
+  const uint8_t *mask = (const uint8_t *)buffer_ + bytes_read_;
+
+  uint8_t timer = TIMER_COUNT;
+  for (uint8_t i = 0; i < TIMER_COUNT; i++) {
+    if (!(active_timers_ & (1 << i))) {
+      timer = i;
+      break;
+    }
+  }
+  if (timer == TIMER_COUNT) {
+    return_code_ = RETURN_GENERAL_ERROR;
+    return;
+  }
+
+  // Take over channels from older timers.
+  release_timers(mask);
+
+  for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+    timers_[timer].mask[i] = mask[i];
+    state_of_channels_[i] |= mask[i];
+  }
+  update_all_channels();
+  timers_[timer].expires_ms = millis() + duration_ms;
+  active_timers_ |= (1 << timer);
+  return_code_ = RETURN_OK;
+}
+
+void HVSwitchingBoardClass::release_timers(const uint8_t *mask) {
+  for (uint8_t i = 0; i < TIMER_COUNT; i++) {
+    if (active_timers_ & (1 << i)) {
+      uint8_t remaining = 0;
+      for (uint8_t j = 0; j < SHIFT_REGISTER_COUNT; j++) {
+        timers_[i].mask[j] &= ~mask[j];
+        remaining |= timers_[i].mask[j];
+      }
+      if (!remaining) {
+        active_timers_ &= ~(1 << i);
+      }
+    }
+  }
+}
+
+void HVSwitchingBoardClass::update_timers() {
+  const uint32_t now = millis();
+  bool changed = false;
+
+  for (uint8_t i = 0; i < TIMER_COUNT; i++) {
+    if ((active_timers_ & (1 << i)) &&
+        ((int32_t)(now - timers_[i].expires_ms) >= 0)) {
+      for (uint8_t j = 0; j < SHIFT_REGISTER_COUNT; j++) {
+        state_of_channels_[j] &= ~timers_[i].mask[j];
+      }
+      active_timers_ &= ~(1 << i);
+      changed = true;
+    }
+  }
+  if (changed) {
+    update_all_channels();
+  }
+}
+
+void HVSwitchingBoardClass::update_on_time() {
+  const uint32_t now = millis();
+  const uint32_t elapsed_ms = now - on_time_update_ms_;
+  on_time_update_ms_ = now;
+
+  for (uint8_t i = 0; i < SHIFT_REGISTER_COUNT; i++) {
+    const uint8_t port = applied_channels_[i];
+    if (!port) {
+      continue;
+    }
+    for (uint8_t j = 0; j < 8; j++) {
+      if (port & (1 << j)) {
+        on_time_ms_[i * 8 + j] += elapsed_ms;
+      }
+    }
+  }
+}
+
+void HVSwitchingBoardClass::load_patterns() {
+  Pattern pattern;
+
+  valid_patterns_ = 0;
+  for (uint8_t slot = 0; slot < PATTERN_SLOT_COUNT; slot++) {
+    eeprom_read_block((void *)&pattern,
+                      (const void *)(EEPROM_PATTERNS_ADDRESS +
+                                     slot * sizeof(Pattern)),
+                      sizeof(pattern));
+    if (pattern.valid == PATTERN_VALID) {
+      memcpy(patterns_[slot], pattern.ports, SHIFT_REGISTER_COUNT);
+      valid_patterns_ |= (1 << slot);
+    } else {
+      // Erased EEPROM reads as `0xFF`; never treat it as a pattern.
+      memset(patterns_[slot], 0, SHIFT_REGISTER_COUNT);
+    }
+  }
+}
+
+void HVSwitchingBoardClass::save_pattern(uint8_t slot, const char *name) {
+  const uintptr_t address = EEPROM_PATTERNS_ADDRESS + slot * sizeof(Pattern);
+  Pattern pattern;
+
+  eeprom_read_block((void *)&pattern, (const void *)address, sizeof(pattern));
+  pattern.valid = PATTERN_VALID;
+  if (name != NULL) {
+    strncpy(pattern.name, name, PATTERN_NAME_LENGTH);
+  }
+  memcpy(pattern.ports, patterns_[slot], SHIFT_REGISTER_COUNT);
+  eeprom_update_block((const void *)&pattern, (void *)address,
+                      sizeof(pattern));
+}
+
+const HVSwitchingBoardClass::Stats &HVSwitchingBoardClass::stats() {
+  ATOMIC_BLOCK(ATOMIC_RESTORESTATE) {
+    stats_.wire_overruns = wire_overruns_;
+  }
+  stats_.free_ram = free_ram();
+  return stats_;
+}
+
 void HVSwitchingBoardClass::update_all_channels() {
   /*
    * .. versionchanged:: 0.9
    *    Support both hardware major versions 2 and 3.
    * .. versionchanged:: 4.1
    *    Use dynamic shift register count.
+   * .. versionchanged:: 4.2
+   *    Record update count and duration.
+   *    Accumulate on time of channels.
    */
+  update_on_time();
+  const uint32_t start_us = micros();
   const uint8_t port_count = SHIFT_REGISTER_COUNT;
 #if ___HARDWARE_MAJOR_VERSION___==2
   // Version 2 hardware uses **software** SPI.
@@ -186,6 +883,22 @@ void HVSwitchingBoardClass::update_all_channels() {
   }
   // Release PCA9505 chips for SPI access.
   digitalWrite(spi_chip_select_pin,  HIGH);
+  memcpy(applied_channels_, state_of_channels_, port_count);
+
+  const uint32_t duration_us = micros() - start_us;
+  stats_.update_count++;
+  stats_.update_last_us = (duration_us > 0xFFFF) ? 0xFFFF : duration_us;
+  if (stats_.update_last_us > stats_.update_max_us) {
+    stats_.update_max_us = stats_.update_last_us;
+  }
+}
+
+uint16_t free_ram() {
+  // Distance between the top of the heap and the bottom of the stack.
+  extern int __heap_start, *__brkval;
+  int v;
+  return (uintptr_t)&v - ((__brkval == 0) ? (uintptr_t)&__heap_start
+                                          : (uintptr_t)__brkval);
 }
 
 void shiftOutFast(uint8_t dataPin, uint8_t clockPin, uint8_t bitOrder,
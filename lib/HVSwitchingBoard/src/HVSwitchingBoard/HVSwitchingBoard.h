@@ -2,11 +2,19 @@
  * @since **0.9**: Support both hardware major versions 2 and 3.
  * @since **0.10**: Add command to reset configuration.
  * @since **0.12**: Add **I2C broadcast** receiving **getter** and **setter**.
+ * @since **4.2**: Add firmware performance counters, echo/sink/source
+ *   commands for I2C benchmarking, EEPROM-persisted I2C clock/serial baud
+ *   rate settings, binary serial frames, sequence-numbered state writes,
+ *   burst writes, pattern slots, auto-off timers, on-time counters,
+ *   multicast groups, and capability negotiation.
  */
 #ifndef ___HV_SWITCHING_BOARD__H___
 #define ___HV_SWITCHING_BOARD__H___
 
 #include <avr/wdt.h>
+#include <avr/eeprom.h>
+#include <util/atomic.h>
+#include <util/crc16.h>
 #if ___HARDWARE_MAJOR_VERSION___>=3
   // Version 3+ hardware uses **hardware** SPI.
 #include <SPI.h>
@@ -21,6 +29,10 @@
  *     most**.
  *
  *    For example, **115200 baud rate** does **not** work **8 MHz clock**.
+ *
+ * .. versionchanged:: 4.2
+ *    Default only; the baud rate may be changed at runtime using
+ *    `CMD_SET_BAUD_RATE`.
  */
 #define HV_SWITCHING_BOARD_BAUD_RATE 57600
 #endif
@@ -30,6 +42,10 @@
  * Set default I2C rate to 400 kHz.
  *
  * See https://www.arduino.cc/en/Reference/WireSetClock for more info.
+ *
+ * .. versionchanged:: 4.2
+ *    Default only; the I2C rate may be changed at runtime using
+ *    `CMD_SET_I2C_RATE`.
  */
 #define HV_SWITCHING_BOARD_I2C_RATE 400000
 #endif
@@ -43,6 +59,23 @@ public:
   //! PCA9505 (gpio) chip **output** register address (for emulation)
   static constexpr uint8_t PCA9505_OUTPUT_PORT_REGISTER_ = 0x08;
 
+  /**
+   * @brief Set state of all channels (one **active LOW** byte per port).
+   *
+   * Payload is either `[v1..vn]`, or a **sequenced frame**
+   * `[seq, v1..vn, crc]`, where `crc` is the CRC-8 (polynomial `0x07`) of
+   * `[seq, v1..vn]`.  The outcome of the last sequenced frame is available
+   * through #CMD_GET_FRAME_STATUS.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SET_STATE_OF_ALL_CHANNELS = 0xA0;
+  /**
+   * @brief Get state of all channels (one **active LOW** byte per port).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_STATE_OF_ALL_CHANNELS = 0xA1;
   //! Perform a software reboot.
   static constexpr uint8_t CMD_REBOOT = 0xA2;
   //! Reset configuration to default.
@@ -62,6 +95,370 @@ public:
    * @since **4.1**: Support configurable shift register count.
    */
   static constexpr uint8_t CMD_GET_SHIFT_REGISTER_COUNT = 0xA6;
+  /**
+   * @brief Get firmware performance counters (see #Stats).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_STATS = 0xA7;
+  /**
+   * @brief Reset firmware performance counters.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_RESET_STATS = 0xA8;
+  /**
+   * @brief Respond with the received payload (outputs are not touched).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_ECHO = 0xA9;
+  /**
+   * @brief Discard the received payload (outputs are not touched).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SINK = 0xAA;
+  /**
+   * @brief Respond with the requested number of bytes (outputs are not
+   * touched).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SOURCE = 0xAB;
+  /**
+   * @brief Maximum payload of a single I2C transfer, i.e., the `Wire` buffer
+   * length less the command byte (or the trailing return code).
+   */
+  static constexpr uint8_t MAX_WIRE_PAYLOAD = BUFFER_LENGTH - 1;
+  /**
+   * @brief Get I2C clock rate and serial baud rate settings.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_BUS_SETTINGS = 0xAC;
+  /**
+   * @brief Set (and persist) I2C clock rate.  Takes effect immediately.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SET_I2C_RATE = 0xAD;
+  /**
+   * @brief Set (and persist) serial baud rate.  Takes effect after reboot.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SET_BAUD_RATE = 0xAE;
+  /**
+   * @brief Get outcome of sequenced frames (see
+   * #CMD_SET_STATE_OF_ALL_CHANNELS).
+   *
+   * Response: `[last applied seq, last status, rejected count, gap count]`,
+   * where counts wrap around at 256.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_FRAME_STATUS = 0xAF;
+  /**
+   * @brief Apply several frames back to back, each followed by a dwell time.
+   *
+   * Payload: `[k, dwell_1..dwell_k, frame_1..frame_k]`, where each dwell is a
+   * `uint16_t` (microseconds) and each frame is one **active LOW** byte per
+   * port.  Dwell times are measured from the start of the burst, so they do
+   * not accumulate output update time.
+   *
+   * @note No other command is processed until the burst (including the last
+   * dwell) is complete.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_PLAY_BURST = 0xB0;
+  /**
+   * @brief Save current state of channels to pattern slot.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SAVE_PATTERN = 0xB1;
+  /**
+   * @brief Apply pattern slot to channels.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_RECALL_PATTERN = 0xB2;
+  /**
+   * @brief Store pattern (and optional name) in slot.
+   *
+   * Payload: `[slot, v1..vn, name]`, where `v1..vn` is one **active LOW**
+   * byte per port and `name` is at most #PATTERN_NAME_LENGTH characters.
+   * Payload `[slot]` erases the slot.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SET_PATTERN = 0xB3;
+  /**
+   * @brief Get pattern slot.
+   *
+   * Response: `[valid, v1..vn, name]` (`name` is #PATTERN_NAME_LENGTH bytes,
+   * padded with `\0`).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_PATTERN = 0xB4;
+  /**
+   * @brief Turn on channels, and turn them off again after a duration.
+   *
+   * Payload: `[duration_ms, m1..mn]`, where `duration_ms` is a `uint16_t`
+   * and `m1..mn` is one **active HIGH** channel mask byte per port.
+   *
+   * A newer timer takes over channels from older timers, and any later
+   * write of a channel (e.g., a port write or full frame) cancels its
+   * pending auto-off.  Returns `RETURN_GENERAL_ERROR` (without turning on
+   * channels) if all #TIMER_COUNT timers are in use.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_ACTUATE_FOR = 0xB5;
+  /**
+   * @brief Cancel all auto-off timers (channels keep their current state).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_CANCEL_TIMERS = 0xB6;
+  /**
+   * @brief Get accumulated on time of channels.
+   *
+   * Payload: `[offset, count]`.  Response: `count` `uint32_t` on times (in
+   * milliseconds) of channels `offset..offset + count - 1`, where `count`
+   * is at most #MAX_ON_TIME_COUNT.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_ON_TIME = 0xB7;
+  /**
+   * @brief Reset accumulated on time of all channels.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_RESET_ON_TIME = 0xB8;
+  /**
+   * @brief Set multicast group membership mask (persistent).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_SET_GROUPS = 0xB9;
+  /**
+   * @brief Get multicast group membership mask.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_GROUPS = 0xBA;
+  /**
+   * @brief Set state of all channels if board is a member of any group in
+   * mask.
+   *
+   * Payload: `[mask, v1..vn]`, where `v1..vn` is one **active LOW** byte
+   * per port.  Intended to be sent as an I2C broadcast (i.e., general call
+   * to address 0) to all boards (with the same number of ports) at once.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GROUP_SET_STATE = 0xBB;
+  /**
+   * @brief Turn off all channels if board is a member of any group in mask.
+   *
+   * Payload: `[mask]`.  Intended to be sent as an I2C broadcast.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GROUP_CLEAR = 0xBC;
+  /**
+   * @brief Get supported feature flags and shift register count.
+   *
+   * Response: `[capabilities, n]`, where `capabilities` is a `uint32_t` bit
+   * mask of `CAP_*` flags (see #CAPABILITIES).
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t CMD_GET_CAPABILITIES = 0xBD;
+
+  //! #CMD_GET_STATS and #CMD_RESET_STATS.
+  static constexpr uint32_t CAP_STATS = 1UL << 0;
+  //! #CMD_ECHO, #CMD_SINK and #CMD_SOURCE.
+  static constexpr uint32_t CAP_BENCHMARK = 1UL << 1;
+  //! #CMD_GET_BUS_SETTINGS, #CMD_SET_I2C_RATE and #CMD_SET_BAUD_RATE.
+  static constexpr uint32_t CAP_BUS_SETTINGS = 1UL << 2;
+  //! #CMD_SET_STATE_OF_ALL_CHANNELS and #CMD_GET_STATE_OF_ALL_CHANNELS.
+  static constexpr uint32_t CAP_STATE_OF_ALL_CHANNELS = 1UL << 3;
+  //! Sequenced #CMD_SET_STATE_OF_ALL_CHANNELS and #CMD_GET_FRAME_STATUS.
+  static constexpr uint32_t CAP_SEQUENCED_FRAMES = 1UL << 4;
+  //! #CMD_PLAY_BURST.
+  static constexpr uint32_t CAP_BURST = 1UL << 5;
+  //! Pattern slots (e.g., #CMD_RECALL_PATTERN).
+  static constexpr uint32_t CAP_PATTERNS = 1UL << 6;
+  //! #CMD_ACTUATE_FOR and #CMD_CANCEL_TIMERS.
+  static constexpr uint32_t CAP_TIMERS = 1UL << 7;
+  //! #CMD_GET_ON_TIME and #CMD_RESET_ON_TIME.
+  static constexpr uint32_t CAP_ON_TIME = 1UL << 8;
+  //! Multicast groups (e.g., #CMD_GROUP_SET_STATE).
+  static constexpr uint32_t CAP_GROUPS = 1UL << 9;
+  //! Binary serial frames (see #SERIAL_FRAME_START).
+  static constexpr uint32_t CAP_SERIAL_FRAMES = 1UL << 10;
+  //! #CMD_GET_SHIFT_REGISTER_COUNT.
+  static constexpr uint32_t CAP_SHIFT_REGISTER_COUNT = 1UL << 11;
+  //! Features supported by this firmware.
+  static constexpr uint32_t CAPABILITIES = (CAP_STATS | CAP_BENCHMARK |
+                                            CAP_BUS_SETTINGS |
+                                            CAP_STATE_OF_ALL_CHANNELS |
+                                            CAP_SEQUENCED_FRAMES | CAP_BURST |
+                                            CAP_PATTERNS | CAP_TIMERS |
+                                            CAP_ON_TIME | CAP_GROUPS |
+                                            CAP_SERIAL_FRAMES |
+                                            CAP_SHIFT_REGISTER_COUNT);
+  //! Maximum number of on times per #CMD_GET_ON_TIME response.
+  static constexpr uint8_t MAX_ON_TIME_COUNT = MAX_WIRE_PAYLOAD /
+    sizeof(uint32_t);
+
+  //! Persistent storage _(i.e., EEPROM)_ address of #Settings.
+  static constexpr uint16_t EEPROM_SETTINGS_ADDRESS = 0x100;
+  //! Layout version of #Settings.
+  static constexpr uint8_t SETTINGS_VERSION = 2;
+  //! Minimum I2C rate, i.e., `TWBR = 255` (prescaler 1).
+  static constexpr uint32_t MIN_I2C_RATE = (F_CPU + 16 + 2 * 255 - 1) /
+    (16 + 2 * 255);
+  //! Maximum I2C rate (fast mode).
+  static constexpr uint32_t MAX_I2C_RATE = 400000;
+  //! Minimum serial baud rate.
+  static constexpr uint32_t MIN_BAUD_RATE = 1200;
+  //! Maximum serial baud rate (double-speed UART, `UBRR = 0`).
+  static constexpr uint32_t MAX_BAUD_RATE = F_CPU / 8;
+
+  /**
+   * @brief First byte of a binary serial frame.
+   *
+   * Text commands are printable ASCII, so a frame start is never mistaken for
+   * a text command.
+   *
+   * Request: `[#SERIAL_FRAME_START, opcode, n, v1..vn, crc]`
+   *
+   * Response: `[#SERIAL_FRAME_START, opcode, return code, n, v1..vn, crc]`
+   *
+   * where `crc` is the CRC-8 (polynomial `0x07`, initial value `0`) of all
+   * bytes following #SERIAL_FRAME_START.
+   *
+   * @since **4.2**
+   */
+  static constexpr uint8_t SERIAL_FRAME_START = 0xA5;
+  //! Maximum payload length of a binary serial frame.
+  static constexpr uint8_t MAX_SERIAL_FRAME_PAYLOAD = 32;
+  //! Time allowed to receive a complete binary serial frame.
+  static constexpr uint16_t SERIAL_FRAME_TIMEOUT_MS = 50;
+  /**
+   * @brief Serial frame opcode: set state of all channels.
+   *
+   * Payload is one **active LOW** byte per port (same as I2C).
+   */
+  static constexpr uint8_t SERIAL_SET_STATE_OF_ALL_CHANNELS = 0x01;
+  /**
+   * @brief Serial frame opcode: get state of all channels.
+   *
+   * Response payload is one **active LOW** byte per port (same as I2C).
+   */
+  static constexpr uint8_t SERIAL_GET_STATE_OF_ALL_CHANNELS = 0x02;
+  //! Serial frame opcode: get firmware performance counters (#Stats).
+  static constexpr uint8_t SERIAL_GET_STATS = 0x03;
+
+  //! Number of pattern slots.
+  static constexpr uint8_t PATTERN_SLOT_COUNT = 8;
+  //! Maximum length of a pattern name.
+  static constexpr uint8_t PATTERN_NAME_LENGTH = 8;
+  //! Persistent storage _(i.e., EEPROM)_ address of first #Pattern slot.
+  static constexpr uint16_t EEPROM_PATTERNS_ADDRESS = 0x120;
+  //! Value of Pattern::valid for a stored pattern.
+  static constexpr uint8_t PATTERN_VALID = 0x01;
+
+  //! Number of auto-off timers (see #CMD_ACTUATE_FOR).
+  static constexpr uint8_t TIMER_COUNT = 8;
+
+  /**
+   * @brief Auto-off timer.
+   *
+   * @since **4.2**
+   */
+  struct Timer {
+    //! `millis()` time at which channels are turned off.
+    uint32_t expires_ms;
+    //! Channels to turn off (**active HIGH**).
+    uint8_t mask[SHIFT_REGISTER_COUNT];
+  };
+
+  /**
+   * @brief Pattern slot, stored at #EEPROM_PATTERNS_ADDRESS.
+   *
+   * @since **4.2**
+   */
+  struct Pattern {
+    //! #PATTERN_VALID if slot holds a pattern.
+    uint8_t valid;
+    //! Name (padded with `\0`).
+    char name[PATTERN_NAME_LENGTH];
+    //! State of channels (**active HIGH**).
+    uint8_t ports[SHIFT_REGISTER_COUNT];
+  };
+
+  /**
+   * @brief Switching board settings, stored at #EEPROM_SETTINGS_ADDRESS.
+   *
+   * @since **4.2**
+   */
+  struct Settings {
+    //! Layout version (#SETTINGS_VERSION).
+    uint8_t version;
+    //! I2C clock rate (Hz).
+    uint32_t i2c_rate;
+    //! Serial baud rate.
+    uint32_t baud_rate;
+    //! Multicast group membership mask (see #CMD_GROUP_SET_STATE).
+    //!
+    //! @since **4.2**: Settings version 2.
+    uint8_t groups;
+  } __attribute__((packed));
+
+  /**
+   * @brief Firmware performance counters.
+   *
+   * The block (plus the trailing return code) fits in a single 32-byte
+   * `Wire` transfer.  Counters wrap around on overflow.
+   *
+   * @since **4.2**
+   */
+  struct Stats {
+    //! PCA9505 output register writes.
+    uint16_t port_writes;
+    //! PCA9505 output register reads.
+    uint16_t port_reads;
+    //! PCA9505 configuration register operations.
+    uint16_t config_commands;
+    //! Switching board commands (i.e., `0xA0` and above).
+    uint16_t board_commands;
+    //! Commands handled by `BaseNode`.
+    uint16_t base_commands;
+    //! Number of calls to update_all_channels().
+    uint32_t update_count;
+    //! Duration of the last update_all_channels() call (microseconds).
+    uint16_t update_last_us;
+    //! Longest update_all_channels() call (microseconds).
+    uint16_t update_max_us;
+    //! Commands that returned `RETURN_GENERAL_ERROR`.
+    uint16_t general_errors;
+    //! Commands that returned `RETURN_UNKNOWN_COMMAND`.
+    uint16_t unknown_commands;
+    //! I2C commands received before the previous one was processed.
+    uint16_t wire_overruns;
+    //! Number of listen() iterations during the last full second.
+    uint32_t loop_rate;
+    //! Free RAM between heap and stack (bytes).
+    uint16_t free_ram;
+  } __attribute__((packed));
 
   // digital pins
   static constexpr uint8_t OE = 8;
@@ -82,11 +479,18 @@ public:
    * @brief Initialize board.
    *
    * @since **0.9**: Support both hardware major versions 2 and 3.
+   * @since **4.2**: Use I2C rate from #Settings.
    *
    * @param baud_rate Serial interface baud rate.
    */
   void begin(uint32_t baud_rate);
-  void begin() { begin(HV_SWITCHING_BOARD_BAUD_RATE); }
+  /**
+   * @brief Initialize board using serial baud rate from #Settings.
+   *
+   * @since **4.2**: Use baud rate from #Settings (defaults to
+   *   `HV_SWITCHING_BOARD_BAUD_RATE`).
+   */
+  void begin();
   /**
    * @brief Process any requests available from **I2C/Wire** input
    *
@@ -95,6 +499,23 @@ public:
    * @since **0.12**: Add **I2C broadcast** receiving \link CMD_GET_GENERAL_CALL_ENABLED **getter**\endlink and
    * @since **0.17**: Add **I2C broadcast** receiving \link CMD_GET_SHIFT_REGISTER_COUNT **getter**\endlink and
    *   \link CMD_SET_GENERAL_CALL_ENABLED **setter**\endlink commands.
+   * @since **4.2**: Add \link CMD_GET_STATS performance counters\endlink.
+   * @since **4.2**: Add \link CMD_ECHO echo\endlink, \link CMD_SINK
+   *   sink\endlink and \link CMD_SOURCE source\endlink benchmark commands.
+   * @since **4.2**: Add \link CMD_GET_BUS_SETTINGS I2C rate/baud rate
+   *   settings\endlink commands.
+   * @since **4.2**: Add \link CMD_SET_STATE_OF_ALL_CHANNELS state of all
+   *   channels\endlink commands, with optional sequence number and CRC.
+   * @since **4.2**: Add \link CMD_PLAY_BURST burst\endlink command.
+   * @since **4.2**: Add \link CMD_SAVE_PATTERN pattern slot\endlink
+   *   commands.
+   * @since **4.2**: Add \link CMD_ACTUATE_FOR auto-off timer\endlink
+   *   commands.
+   * @since **4.2**: Add \link CMD_GET_ON_TIME on time\endlink commands.
+   * @since **4.2**: Add \link CMD_GROUP_SET_STATE multicast group\endlink
+   *   commands.
+   * @since **4.2**: Add \link CMD_GET_CAPABILITIES capabilities\endlink
+   *   command.
    *
    * ## Commands
    *
@@ -106,11 +527,37 @@ public:
    * | `[#PCA9505_OUTPUT_PORT_REGISTER_+p]`         | N/A                                 | `#state_of_channels_[p]`  |
    * | `[#PCA9505_OUTPUT_PORT_REGISTER_+p, v]`      | `#state_of_channels_[p] = v`        | N/A                       |
    * | `[#PCA9505_OUTPUT_PORT_REGISTER_+p, v1..vn]` | `#state_of_channels_[p:] = v1..vn`  | N/A                       |
+   * | `[#CMD_SET_STATE_OF_ALL_CHANNELS, v1..vn]`   | `#state_of_channels_ = ~v1..vn`     | N/A                       |
+   * | `[#CMD_SET_STATE_OF_ALL_CHANNELS, s, v1..vn, crc]` | Same, if `crc` is valid       | N/A                       |
+   * | `[#CMD_GET_STATE_OF_ALL_CHANNELS]`           | N/A                                 | `~#state_of_channels_`    |
    * | `[#CMD_REBOOT]`                              | Reboot                              | N/A                       |
    * | `[#CMD_RESET_CONFIG]`                        | Reset config to default             | N/A                       |
    * | `[#CMD_SET_GENERAL_CALL_ENABLED, v]`         | Receive I2C broadcasts if `v`       | N/A                       |
    * | `[#CMD_GET_GENERAL_CALL_ENABLED, v]`         | N/A                                 | `[<receiving broadcasts]` |
    * | `[#CMD_GET_SHIFT_REGISTER_COUNT]`            | N/A                                 | `[<shift register count>]`|
+   * | `[#CMD_GET_STATS]`                           | N/A                                 | `#Stats`                  |
+   * | `[#CMD_RESET_STATS]`                         | Reset performance counters          | N/A                       |
+   * | `[#CMD_ECHO, v1..vn]`                        | N/A                                 | `[v1..vn]`                |
+   * | `[#CMD_SINK, v1..vn]`                        | Discard payload                     | N/A                       |
+   * | `[#CMD_SOURCE, n]`                           | N/A                                 | `[0..n-1]`                |
+   * | `[#CMD_GET_BUS_SETTINGS]`                    | N/A                                 | `[<i2c rate>, <baud>]`    |
+   * | `[#CMD_SET_I2C_RATE, <uint32>]`              | Set and persist I2C rate            | N/A                       |
+   * | `[#CMD_SET_BAUD_RATE, <uint32>]`             | Persist baud rate (after reboot)    | N/A                       |
+   * | `[#CMD_GET_FRAME_STATUS]`                    | N/A                                 | `[s, status, rej, gaps]`  |
+   * | `[#CMD_PLAY_BURST, k, d1..dk, f1..fk]`       | Apply frames, dwell after each      | N/A                       |
+   * | `[#CMD_SAVE_PATTERN, i]`                     | Save state to pattern slot `i`      | N/A                       |
+   * | `[#CMD_RECALL_PATTERN, i]`                   | Apply pattern slot `i`              | N/A                       |
+   * | `[#CMD_SET_PATTERN, i, v1..vn, name]`        | Store pattern in slot `i`           | N/A                       |
+   * | `[#CMD_GET_PATTERN, i]`                      | N/A                                 | `[valid, v1..vn, name]`   |
+   * | `[#CMD_ACTUATE_FOR, t, m1..mn]`              | Turn on channels for `t` ms         | N/A                       |
+   * | `[#CMD_CANCEL_TIMERS]`                       | Cancel auto-off timers              | N/A                       |
+   * | `[#CMD_GET_ON_TIME, offset, count]`          | N/A                                 | `[t1..t_count]`           |
+   * | `[#CMD_RESET_ON_TIME]`                       | Reset on time counters              | N/A                       |
+   * | `[#CMD_SET_GROUPS, mask]`                    | Set group membership mask           | N/A                       |
+   * | `[#CMD_GET_GROUPS]`                          | N/A                                 | `[mask]`                  |
+   * | `[#CMD_GROUP_SET_STATE, mask, v1..vn]`       | Set all channels if in group        | N/A                       |
+   * | `[#CMD_GROUP_CLEAR, mask]`                   | Turn off all channels if in group   | N/A                       |
+   * | `[#CMD_GET_CAPABILITIES]`                    | N/A                                 | `[capabilities, n]`       |
    *
    * @return `true` if a request was processed.
    */
@@ -119,10 +566,31 @@ public:
    * @brief Process any requests available from **serial input**
    *
    * @since **0.8**: Add `reboot()` serial command.
+   * @since **4.2**: Do not allocate `String` objects or copy command names
+   *   from program memory.
    *
    * @return `true` if a request was processed.
    */
   bool process_serial_input();
+  /**
+   * @brief Process pending serial/I2C requests and update loop rate counter.
+   *
+   * Binary serial frames (see #SERIAL_FRAME_START) are handled before text
+   * commands.
+   *
+   * @since **4.2**
+   */
+  void listen();
+  /**
+   * @brief Count I2C receive overruns, then delegate to
+   * `BaseNode::handle_wire_receive()`.
+   *
+   * A receive is an overrun if the previous command has not been processed
+   * yet, or if the payload does not fit in the command buffer.
+   *
+   * @since **4.2**
+   */
+  static void handle_wire_receive(int n_bytes);
   /**
    * @brief Enable/disable receiving of broadcasts, i.e., messages sent to
    * address 0.
@@ -144,16 +612,191 @@ public:
    * @return `true` if receiving of broadcasts is **enabled**.
    */
   bool general_call() const { return TWAR & 0x01; }
+  /**
+   * @brief Check that I2C rate is achievable with the CPU clock.
+   *
+   * @since **4.2**
+   */
+  static bool valid_i2c_rate(uint32_t rate) {
+    return (rate >= MIN_I2C_RATE) && (rate <= MAX_I2C_RATE);
+  }
+  /**
+   * @brief Check that baud rate is achievable with the CPU clock, i.e., that
+   * the UART baud rate error is at most 2.5%.
+   *
+   * For example, with an **8 MHz clock**, 57600 and 250000 are valid, but
+   * 115200 is **not**.
+   *
+   * @since **4.2**
+   */
+  static bool valid_baud_rate(uint32_t baud_rate) {
+    if ((baud_rate < MIN_BAUD_RATE) || (baud_rate > MAX_BAUD_RATE)) {
+      return false;
+    }
+    // Same calculation as `HardwareSerial::begin()` (double-speed mode).
+    const uint32_t setting = (F_CPU / 4 / baud_rate - 1) / 2;
+    const uint32_t actual = F_CPU / (8 * (setting + 1));
+    const uint32_t error = ((actual > baud_rate) ? actual - baud_rate
+                            : baud_rate - actual);
+    return error * 40 <= baud_rate;
+  }
 protected:
   bool supports_isp() { return true; }
 private:
+  /**
+   * @brief Load #settings_ from persistent storage.
+   *
+   * Defaults (`HV_SWITCHING_BOARD_I2C_RATE` and
+   * `HV_SWITCHING_BOARD_BAUD_RATE`, no groups) are used (and saved) if
+   * \a use_defaults is `true`, or if stored settings are missing.  Invalid
+   * fields are reset to their default individually (the build default baud
+   * rate is always accepted).  Version 1 settings are upgraded in place.
+   *
+   * @since **4.2**
+   */
+  void load_settings(bool use_defaults=false);
+  /**
+   * @brief Initialize serial, I2C and output hardware, with #settings_
+   * already loaded (see begin()).
+   *
+   * @since **4.2**
+   */
+  void begin_hardware(uint32_t baud_rate);
+  //! Save #settings_ to persistent storage.
+  void save_settings() {
+    eeprom_update_block((const void *)&settings_,
+                        (void *)EEPROM_SETTINGS_ADDRESS, sizeof(settings_));
+  }
+  //! Persistent switching board settings.
+  Settings settings_;
   /**
    * @brief Propagate channel states from #state_of_channels_ to output
    * registers.
    *
    * @since **0.9**: Support both hardware major versions 2 and 3.
+   * @since **4.2**: Accumulate on time of channels (see
+   *   update_on_time()).
    */
   void update_all_channels();
+  /**
+   * @brief Add time since last call to #on_time_ms_ of each channel that is
+   * on in #applied_channels_.
+   *
+   * @since **4.2**
+   */
+  void update_on_time();
+  /**
+   * @brief Set #state_of_channels_ from **active LOW** port bytes and
+   * propagate to outputs.
+   *
+   * @since **4.2**
+   */
+  void set_state_of_all_channels(const uint8_t *ports);
+  /**
+   * @brief Apply sequenced frame `[seq, v1..vn, crc]` from command buffer.
+   *
+   * @since **4.2**
+   */
+  void process_sequenced_frame();
+  /**
+   * @brief Play burst `[k, dwell_1..dwell_k, frame_1..frame_k]` from command
+   * buffer (see #CMD_PLAY_BURST).
+   *
+   * @since **4.2**
+   */
+  void play_burst();
+  /**
+   * @brief Process pattern slot command (e.g., #CMD_SAVE_PATTERN).
+   *
+   * @since **4.2**
+   */
+  void process_pattern_command();
+  /**
+   * @brief Start auto-off timer `[duration_ms, m1..mn]` from command buffer
+   * (see #CMD_ACTUATE_FOR).
+   *
+   * @since **4.2**
+   */
+  void actuate_for();
+  /**
+   * @brief Remove channels in \p mask (one **active HIGH** byte per port)
+   * from pending auto-off timers, freeing timers left without channels.
+   *
+   * @since **4.2**
+   */
+  void release_timers(const uint8_t *mask);
+  /**
+   * @brief Turn off channels of expired auto-off timers.
+   *
+   * @since **4.2**
+   */
+  void update_timers();
+  //! Load pattern slots from persistent storage into #patterns_.
+  void load_patterns();
+  //! Save pattern slot to persistent storage (name is left unchanged if
+  //! \a name is `NULL`).
+  void save_pattern(uint8_t slot, const char *name);
+  /**
+   * @brief Refresh interrupt/RAM counters in #stats_.
+   *
+   * @return Reference to #stats_.
+   */
+  const Stats &stats();
+  /**
+   * @brief Match text command against an argument-less function name (e.g.,
+   * `"reboot()"`) in **program memory**.
+   *
+   * Unlike `BaseNode::match_function()`, the name is not copied to RAM.
+   */
+  bool match_function_P(PGM_P function_name) {
+    return strcmp_P((const char *)buffer_, function_name) == 0;
+  }
+  /**
+   * @brief Read and process one binary serial frame (see
+   * #SERIAL_FRAME_START).
+   *
+   * @since **4.2**
+   */
+  void process_serial_frame();
+  /**
+   * @brief Read bytes from serial, waiting at most until \a deadline_ms.
+   *
+   * @return `true` if all \a count bytes were read.
+   */
+  bool read_serial_bytes(uint8_t *data, uint8_t count, uint32_t deadline_ms);
+  //! Write binary serial response frame.
+  void write_serial_frame(uint8_t opcode, uint8_t return_code,
+                          const uint8_t *payload, uint8_t length);
+  //! Firmware performance counters.
+  Stats stats_;
+  //! I2C receive overruns (updated from the `Wire` receive interrupt).
+  static volatile uint16_t wire_overruns_;
+  //! listen() iterations since #loop_rate_start_ms_.
+  uint32_t loop_count_;
+  //! Start of current loop rate measurement window.
+  uint32_t loop_rate_start_ms_;
+  //! Pattern slots (**active HIGH**), preloaded from persistent storage.
+  uint8_t patterns_[PATTERN_SLOT_COUNT][SHIFT_REGISTER_COUNT];
+  //! Bit mask of pattern slots holding a pattern.
+  uint8_t valid_patterns_;
+  //! Auto-off timers.
+  Timer timers_[TIMER_COUNT];
+  //! Bit mask of auto-off timers in use.
+  uint8_t active_timers_;
+  //! Sequence number of last applied sequenced frame.
+  uint8_t last_sequence_;
+  //! Return code of last sequenced frame.
+  uint8_t last_frame_status_;
+  //! Number of sequenced frames rejected (wraps around).
+  uint8_t rejected_frames_;
+  //! Number of sequenced frames not following the previous one (wraps around).
+  uint8_t sequence_gaps_;
+  //! Accumulated on time of each channel (milliseconds).
+  uint32_t on_time_ms_[SHIFT_REGISTER_COUNT * 8];
+  //! `millis()` time of last update_on_time() call.
+  uint32_t on_time_update_ms_;
+  //! State of channels last propagated to outputs.
+  uint8_t applied_channels_[SHIFT_REGISTER_COUNT];
   //! Requested state of channels (packed, one bit per channel).
   uint8_t state_of_channels_[SHIFT_REGISTER_COUNT];
   //! Configuration registers to emulate PCA9505 protocol.